@@ -1,23 +1,49 @@
 from __future__ import annotations
+import time
+_IMPORT_STARTED = time.perf_counter()
 import base64
+import hashlib
+import hmac
 import io
+import json
 import logging
 import re
-import time
-from dataclasses import dataclass
+import sys
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import threading
 import os
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
 import requests
-from flask import Flask, jsonify, request, session, redirect
-from google.auth.transport.requests import Request as GoogleRequest
-from google.oauth2 import service_account, credentials as oauth_credentials
-from googleapiclient.discovery import build
+from flask import Flask, Response, g, jsonify, request, session, redirect, stream_with_context
 from googleapiclient.errors import HttpError
-from openai import OpenAI
-from pypdf import PdfReader
 from config import settings
+import calendar_sync
+import classroom
+import guards
+from metrics import (
+  CACHE_HITS, CACHE_MISSES, CONTENT_TYPE as METRICS_CONTENT_TYPE, ERRORS, HTTP_LATENCY,
+  POLLER_LAG, QUEUE_DEPTH, REGISTRY, STAGE_LATENCY, UPSTREAM_LATENCY,
+)
+import notify
+import prefetch
+import profiling
+import shared
+import tracing
+from store import Store, account_key
+from tracing import current_span, traced
+
+# openai, pypdf, googleapiclient.discovery and google.oauth2 are imported on
+# first use: together they are most of the import time, and processes that
+# only serve /health, the webhook or the poller may never need them.
+# python -m bench.imports prints the import profile against the budget.
+if TYPE_CHECKING:
+  from openai import OpenAI
 
 
 FLASK_SECRET_KEY = settings.flask_secret_key or os.environ.get("FLASK_SECRET_KEY")
@@ -41,6 +67,9 @@ if settings.google_project_id and settings.google_private_key:
 GMAIL_DELEGATED_USER = settings.gmail_delegated_user
 
 GOOGLE_SCOPES = (settings.google_scopes.split(",") if getattr(settings, "google_scopes", None) else ["https://www.googleapis.com/auth/gmail.readonly"])
+# Requested at consent; Classroom and Calendar are optional and used only
+# when the user granted them (see has_scopes)
+OAUTH_SCOPES = GOOGLE_SCOPES + classroom.CLASSROOM_SCOPES + [calendar_sync.CALENDAR_SCOPE]
 
 # OAuth (user consent)
 OAUTH_CLIENT_ID = settings.oauth_client_id
@@ -50,17 +79,75 @@ OAUTH_REDIRECT_URI = settings.oauth_redirect_uri
 # OpenAI
 OPENAI_API_KEY = settings.openai_api_key
 OPENAI_MODEL = settings.openai_model
+OPENAI_TIMEOUT = float(getattr(settings, "openai_timeout", None) or os.environ.get("OPENAI_TIMEOUT") or 60)
 
 # Telegram Bot
 TELEGRAM_BOT_TOKEN = settings.telegram_bot_token
 TELEGRAM_API_BASE = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}" if TELEGRAM_BOT_TOKEN else None
 
+# Admin-only debug endpoints (profiling, tracemalloc) require X-Admin-Token
+ADMIN_TOKEN = getattr(settings, "admin_token", None) or os.environ.get("ADMIN_TOKEN")
+
+# Tracing (OTLP/JSON export to a file and/or collector, slow traces always logged)
+tracing.configure(
+  file=getattr(settings, "trace_file", None) or os.environ.get("TRACE_FILE"),
+  endpoint=getattr(settings, "otlp_endpoint", None) or os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"),
+  slow_ms=float(getattr(settings, "trace_slow_ms", None) or os.environ.get("TRACE_SLOW_MS") or 2000),
+)
+
 TELEGRAM_CHAT_TOKENS: dict[int, dict] = {}
 TOKENS_LOCK = threading.Lock()
 
 NOTIFIED_EMAILS: dict[int, set[str]] = {}
 NOTIFY_LOCK = threading.Lock()
 
+# Local index of Gmail + Classroom items (see store.py)
+STORE = Store(getattr(settings, "store_path", None) or os.environ.get("ACADIFY_DB") or "acadify.db")
+ACCOUNT_SYNC_INTERVAL = int(getattr(settings, "account_sync_interval", None) or os.environ.get("ACCOUNT_SYNC_INTERVAL") or 300)
+GMAIL_REINDEX_INTERVAL = int(getattr(settings, "gmail_reindex_interval", None) or os.environ.get("GMAIL_REINDEX_INTERVAL") or 60)
+CALENDAR_ID = getattr(settings, "calendar_id", None) or os.environ.get("CALENDAR_ID") or "primary"
+
+# Heavy-work budgets. Attachments over MAX_ATTACHMENT_BYTES are refused
+# (413), PDFs are read to at most MAX_PDF_PAGES pages and summarizer input
+# is clipped to MAX_SUMMARY_TOKENS (~4 chars per token).
+MAX_ATTACHMENT_BYTES = int(getattr(settings, "max_attachment_bytes", None) or os.environ.get("MAX_ATTACHMENT_BYTES") or 10 * 1024 * 1024)
+MAX_PDF_PAGES = int(getattr(settings, "max_pdf_pages", None) or os.environ.get("MAX_PDF_PAGES") or 20)
+MAX_SUMMARY_TOKENS = int(getattr(settings, "max_summary_tokens", None) or os.environ.get("MAX_SUMMARY_TOKENS") or 4000)
+# Admission control (see guards.py): attachment downloads and PDF parsing
+# share HEAVY_MEMORY_MB, weighted by size x DOWNLOAD_MEMORY_FACTOR (base64
+# response + bytes) or x PDF_MEMORY_FACTOR (parsed pages hold several
+# copies); each user may run HEAVY_PER_USER jobs of a kind at once; a job
+# that cannot start within ADMISSION_WAIT seconds is shed with 503.
+HEAVY_MEMORY_MB = int(getattr(settings, "heavy_memory_mb", None) or os.environ.get("HEAVY_MEMORY_MB") or 256)
+DOWNLOAD_MEMORY_FACTOR = 2
+PDF_MEMORY_FACTOR = 4
+HEAVY_PER_USER = int(getattr(settings, "heavy_per_user", None) or os.environ.get("HEAVY_PER_USER") or 2)
+ADMISSION_WAIT = float(getattr(settings, "admission_wait", None) or os.environ.get("ADMISSION_WAIT") or 2)
+ATTACHMENT_GATE = guards.Gate(
+  "attachment", int(getattr(settings, "attachment_concurrency", None) or os.environ.get("ATTACHMENT_CONCURRENCY") or 4),
+  HEAVY_PER_USER, memory_bytes=HEAVY_MEMORY_MB * 1024 * 1024, wait=ADMISSION_WAIT,
+)
+LLM_GATE = guards.Gate(
+  "llm", int(getattr(settings, "llm_concurrency", None) or os.environ.get("LLM_CONCURRENCY") or 8),
+  HEAVY_PER_USER, wait=ADMISSION_WAIT,
+)
+# Parsing, PDF text and summaries shared across recipients (see shared.py);
+# a request waits for another's computation of the same content for up to
+# one LLM call, then computes it itself (shed, if at all, by the gates above).
+# Content and its artifacts are kept for CONTENT_TTL_DAYS.
+CONTENT_TTL_DAYS = int(getattr(settings, "content_ttl_days", None) or os.environ.get("CONTENT_TTL_DAYS") or 30)
+SHARED = shared.SharedContent(STORE, wait=OPENAI_TIMEOUT, ttl=CONTENT_TTL_DAYS * 86400)
+
+# Startup: import budget (logged when exceeded, reported by /ready) and the
+# subsystems to preload on a background thread once the app is importable
+STARTUP_BUDGET_MS = float(getattr(settings, "startup_budget_ms", None) or os.environ.get("STARTUP_BUDGET_MS") or 500)
+WARM_SUBSYSTEMS = [
+  s.strip() for s in (getattr(settings, "warm_subsystems", None) or os.environ.get("WARM_SUBSYSTEMS") or "").split(",") if s.strip()
+]
+# Discovery documents: <DISCOVERY_DIR>/<api>.<version>.json when present,
+# else the copies bundled with google-api-python-client; read once
+DISCOVERY_DIR = getattr(settings, "discovery_dir", None) or os.environ.get("DISCOVERY_DIR")
+
 
 app = Flask(__name__)
 app.secret_key = FLASK_SECRET_KEY
@@ -71,48 +158,105 @@ def build_gmail_service_from_oauth():
   tokens = session.get("gmail_oauth_tokens")
   if not tokens:
     return None
+  return build_gmail_service_from_tokens_dict(tokens)
+
+
+_DISCOVERY_DOCS: Dict[Tuple[str, str], str] = {}
+_DISCOVERY_LOCK = threading.Lock()
+
+
+def discovery_doc(api: str, version: str) -> Optional[str]:
+  key = (api, version)
+  doc = _DISCOVERY_DOCS.get(key)
+  if doc is not None:
+    CACHE_HITS.inc(cache="discovery")
+    return doc
+  CACHE_MISSES.inc(cache="discovery")
+  with _DISCOVERY_LOCK, STAGE_LATENCY.time(stage="discovery_load"):
+    raw = None
+    path = os.path.join(DISCOVERY_DIR, f"{api}.{version}.json") if DISCOVERY_DIR else None
+    if path and os.path.exists(path):
+      with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    else:
+      from googleapiclient import discovery_cache
+      raw = discovery_cache.get_static_doc(api, version)
+    if raw is not None:
+      _DISCOVERY_DOCS[key] = raw
+  return raw
+
+
+def build_service(api: str, version: str, credentials):
+  # build_from_document fills method parameters into the dict it is given,
+  # so the raw JSON is cached and every build parses its own copy
+  from googleapiclient.discovery import build, build_from_document
+  doc = discovery_doc(api, version)
+  if doc is None:
+    return build(api, version, credentials=credentials, cache_discovery=False)
+  return build_from_document(doc, credentials=credentials)
+
+
+def has_scopes(tokens: Optional[Dict[str, Any]], scopes: List[str]) -> bool:
+  granted = set(((tokens or {}).get("scope") or "").split())
+  return set(scopes) <= granted
+
+
+def _credentials_from_tokens(tokens: Dict[str, Any]):
+  from google.auth.transport.requests import Request as GoogleRequest
+  from google.oauth2 import credentials as oauth_credentials
+  # Refresh with what the user actually granted: google-auth sends these
+  # scopes and the refresh fails if any of them was not granted
   creds = oauth_credentials.Credentials(
     token=tokens.get("access_token"),
     refresh_token=tokens.get("refresh_token"),
     token_uri="https://oauth2.googleapis.com/token",
     client_id=OAUTH_CLIENT_ID,
     client_secret=OAUTH_CLIENT_SECRET,
-    scopes=GOOGLE_SCOPES,
+    scopes=(tokens.get("scope") or "").split() or None,
   )
   try:
     if not creds.valid and creds.refresh_token:
       creds.refresh(GoogleRequest())
   except Exception:
     return None
-  return build("gmail", "v1", credentials=creds, cache_discovery=False)
+  return creds
 
 
 def build_gmail_service_from_tokens_dict(tokens: Dict[str, Any]):
   if not tokens:
     return None
-  creds = oauth_credentials.Credentials(
-    token=tokens.get("access_token"),
-    refresh_token=tokens.get("refresh_token"),
-    token_uri="https://oauth2.googleapis.com/token",
-    client_id=OAUTH_CLIENT_ID,
-    client_secret=OAUTH_CLIENT_SECRET,
-    scopes=GOOGLE_SCOPES,
-  )
-  try:
-    if not creds.valid and creds.refresh_token:
-      creds.refresh(GoogleRequest())
-  except Exception:
+  creds = _credentials_from_tokens(tokens)
+  if creds is None:
     return None
-  return build("gmail", "v1", credentials=creds, cache_discovery=False)
+  return build_service("gmail", "v1", creds)
+
+
+def build_classroom_service_from_tokens_dict(tokens: Dict[str, Any]):
+  if not tokens or not has_scopes(tokens, classroom.CLASSROOM_SCOPES):
+    return None
+  creds = _credentials_from_tokens(tokens)
+  if creds is None:
+    return None
+  return build_service("classroom", "v1", creds)
+
+
+def build_calendar_service_from_tokens_dict(tokens: Dict[str, Any]):
+  if not tokens or not has_scopes(tokens, [calendar_sync.CALENDAR_SCOPE]):
+    return None
+  creds = _credentials_from_tokens(tokens)
+  if creds is None:
+    return None
+  return build_service("calendar", "v3", creds)
 
 
 def build_gmail_service_service_account():
+  from google.oauth2 import service_account
   credentials = service_account.Credentials.from_service_account_info(
     GOOGLE_SERVICE_ACCOUNT, scopes=GOOGLE_SCOPES
   )
   if GMAIL_DELEGATED_USER:
     credentials = credentials.with_subject(GMAIL_DELEGATED_USER)
-  return build("gmail", "v1", credentials=credentials, cache_discovery=False)
+  return build_service("gmail", "v1", credentials)
 
 
 def get_gmail_service():
@@ -122,94 +266,260 @@ def get_gmail_service():
   return build_gmail_service_service_account()
 
 
-@dataclass
+# Only the headers the app reads are kept, under interned names
+HEADER_FIELDS = tuple(sys.intern(h) for h in ("Subject", "From", "Date"))
+
+
+class MessageHeaders:
+  __slots__ = HEADER_FIELDS
+
+  def __init__(self, raw_headers: List[Dict[str, Any]]):
+    for name in HEADER_FIELDS:
+      setattr(self, name, None)
+    for h in raw_headers:
+      name = h.get("name")
+      if name in HEADER_FIELDS and getattr(self, name) is None:
+        setattr(self, name, h.get("value"))
+
+  def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+    value = getattr(self, name, None) if name in HEADER_FIELDS else None
+    return default if value is None else value
+
+
+class Attachment(NamedTuple):
+  id: str
+  filename: str
+  mime_type: Optional[str]
+  size: int = 0
+
+  @property
+  def is_pdf(self) -> bool:
+    return (self.mime_type or "").lower() == "application/pdf" or self.filename.lower().endswith(".pdf")
+
+  def to_dict(self) -> Dict[str, Any]:
+    return {"id": self.id, "filename": self.filename, "mimeType": self.mime_type}
+
+
+@dataclass(slots=True)
 class GmailMessage:
   id: str
   thread_id: str
   snippet: str
   internal_date: int
-  headers: Dict[str, str]
-  body_text: Optional[str] = None
-  attachments: Optional[List[Dict[str, Any]]] = None
+  headers: MessageHeaders
+  label_ids: Tuple[str, ...] = ()
+  attachments: Tuple[Attachment, ...] = ()
+  # body stays base64 until first read; most listings never touch it
+  body_data: Optional[str] = None
+  body_is_html: bool = False
+  _body: Optional[str] = field(default=None, repr=False)
+
+  @property
+  def body_text(self) -> Optional[str]:
+    if self._body is None and self.body_data is not None:
+      with STAGE_LATENCY.time(stage="body_decode"):
+        text = base64.urlsafe_b64decode(self.body_data).decode(errors="ignore")
+        self._body = re.sub(r"<[^>]+>", " ", text) if self.body_is_html else text
+      self.body_data = None
+    return self._body
+
+
+@dataclass(slots=True)
+class ParsedItem:
+  title: str
+  type: str
+  source: str = "gmail"
+  email_id: Optional[str] = None
+  due_ts: Optional[int] = None  # epoch ms
+
+  def to_dict(self) -> Dict[str, Any]:
+    out = {"title": self.title, "type": self.type, "source": self.source}
+    if self.email_id is not None:
+      out["emailId"] = self.email_id
+    if self.due_ts is not None:
+      out["dueAt"] = self.due_ts
+    return out
+
+
+class MessageBatch:
+  # Columnar form for bulk listings: one list per field instead of one
+  # object per message, so a page of results costs a handful of lists.
+  __slots__ = ("ids", "subjects", "types", "internal_dates")
+
+  def __init__(self):
+    self.ids: List[str] = []
+    self.subjects: List[str] = []
+    self.types: List[str] = []
+    self.internal_dates = array("q")
+
+  def __len__(self) -> int:
+    return len(self.ids)
+
+  def append(self, msg: GmailMessage, item: ParsedItem) -> None:
+    self.ids.append(msg.id)
+    self.subjects.append(item.title)
+    self.types.append(item.type)
+    self.internal_dates.append(msg.internal_date)
+
+  def items(self, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    for i in range(len(self.ids) if limit is None else min(limit, len(self.ids))):
+      yield {"title": self.subjects[i], "type": self.types[i], "source": "gmail", "emailId": self.ids[i]}
+
+
+@traced("gmail.list_messages")
+def list_messages_page(query: Optional[str] = None, max_results: int = 50, page_token: Optional[str] = None, svc=None) -> Tuple[List[str], Optional[str]]:
+  try:
+    svc = svc or get_gmail_service()
+    with UPSTREAM_LATENCY.time(service="gmail", op="messages.list"):
+      resp = (
+        svc.users().messages().list(userId="me", q=query, maxResults=max_results, pageToken=page_token).execute()
+      )
+    ids = [m["id"] for m in resp.get("messages", [])]
+    current_span().set("count", len(ids))
+    return ids, resp.get("nextPageToken")
+  except HttpError as e:
+    ERRORS.inc(where="gmail.list")
+    logger.error("Error listing messages: %s", e)
+    return [], None
 
 
 def list_messages(query: Optional[str] = None, max_results: int = 50, svc=None) -> List[str]:
+  return list_messages_page(query=query, max_results=max_results, svc=svc)[0]
+
+
+def list_all_message_ids(query: str, svc=None, max_pages: int = 20) -> Optional[List[str]]:
+  """Every id matching `query` (500 per page), or None when a page fails or
+  there are more than `max_pages` pages: callers that treat the result as
+  the complete set must not act on a partial one."""
+  ids: List[str] = []
+  page_token = None
   try:
     svc = svc or get_gmail_service()
-    resp = (
-      svc.users().messages().list(userId="me", q=query, maxResults=max_results).execute()
-    )
-    return [m["id"] for m in resp.get("messages", [])]
+    for _ in range(max_pages):
+      with UPSTREAM_LATENCY.time(service="gmail", op="messages.list"):
+        resp = svc.users().messages().list(userId="me", q=query, maxResults=500, pageToken=page_token).execute()
+      ids.extend(m["id"] for m in resp.get("messages", []))
+      page_token = resp.get("nextPageToken")
+      if not page_token:
+        return ids
   except HttpError as e:
-    logger.error("Error listing messages: %s", e)
-    return []
+    ERRORS.inc(where="gmail.list")
+    logger.error("Error listing %s: %s", query, e)
+    return None
+  logger.warning("More than %d pages for %s; not using a partial list", max_pages, query)
+  return None
 
 
-def _extract_body_text(payload: Dict[str, Any]) -> Optional[str]:
+def _find_body_part(payload: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+  # (base64 data, is_html) of the part body_text should come from
   parts = payload.get("parts") or []
   if payload.get("mimeType") == "text/plain" and payload.get("body", {}).get("data"):
-    return base64.urlsafe_b64decode(payload["body"]["data"]).decode(errors="ignore")
+    return payload["body"]["data"], False
   for p in parts:
     if p.get("mimeType") == "text/plain" and p.get("body", {}).get("data"):
-      return base64.urlsafe_b64decode(p["body"]["data"]).decode(errors="ignore")
+      return p["body"]["data"], False
   for p in parts:
     if p.get("mimeType") == "text/html" and p.get("body", {}).get("data"):
-      html = base64.urlsafe_b64decode(p["body"]["data"]).decode(errors="ignore")
-      return re.sub(r"<[^>]+>", " ", html)
-  return None
+      return p["body"]["data"], True
+  return None, False
 
 
-def _extract_attachments_meta(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
-  out: List[Dict[str, Any]] = []
+def _extract_attachments_meta(payload: Dict[str, Any]) -> Tuple[Attachment, ...]:
+  out: List[Attachment] = []
   parts = payload.get("parts") or []
   for p in parts:
     filename = p.get("filename")
-    att_id = (p.get("body") or {}).get("attachmentId")
+    body = p.get("body") or {}
+    att_id = body.get("attachmentId")
     if filename and att_id:
-      out.append({"id": att_id, "filename": filename, "mimeType": p.get("mimeType")})
+      out.append(Attachment(att_id, filename, p.get("mimeType"), int(body.get("size") or 0)))
     for sp in (p.get("parts") or []):
       fname = sp.get("filename")
-      att_id2 = (sp.get("body") or {}).get("attachmentId")
+      sbody = sp.get("body") or {}
+      att_id2 = sbody.get("attachmentId")
       if fname and att_id2:
-        out.append({"id": att_id2, "filename": fname, "mimeType": sp.get("mimeType")})
-  return out
+        out.append(Attachment(att_id2, fname, sp.get("mimeType"), int(sbody.get("size") or 0)))
+  return tuple(out)
+
+
+@STAGE_LATENCY.time(stage="mime_decode")
+def message_from_raw(raw: Dict[str, Any]) -> GmailMessage:
+  payload = raw.get("payload", {})
+  body_data, body_is_html = _find_body_part(payload)
+  return GmailMessage(
+    id=raw.get("id"),
+    thread_id=raw.get("threadId"),
+    snippet=raw.get("snippet", ""),
+    internal_date=int(raw.get("internalDate", 0)),
+    headers=MessageHeaders(payload.get("headers", [])),
+    label_ids=tuple(sys.intern(label) for label in raw.get("labelIds", ())),
+    attachments=_extract_attachments_meta(payload),
+    body_data=body_data,
+    body_is_html=body_is_html,
+  )
 
 
+@traced("gmail.get_message")
 def get_message(email_id: str, svc=None) -> Optional[GmailMessage]:
   try:
     svc = svc or get_gmail_service()
-    raw = svc.users().messages().get(userId="me", id=email_id, format="full").execute()
-    payload = raw.get("payload", {})
-    headers = {h.get("name"): h.get("value") for h in payload.get("headers", [])}
-    return GmailMessage(
-      id=raw.get("id"),
-      thread_id=raw.get("threadId"),
-      snippet=raw.get("snippet", ""),
-      internal_date=int(raw.get("internalDate", 0)),
-      headers=headers,
-      body_text=_extract_body_text(payload),
-      attachments=_extract_attachments_meta(payload),
-    )
+    with UPSTREAM_LATENCY.time(service="gmail", op="messages.get"):
+      raw = svc.users().messages().get(userId="me", id=email_id, format="full").execute()
+    current_span().set("bytes", int(raw.get("sizeEstimate", 0)))
+    return message_from_raw(raw)
   except HttpError as e:
+    ERRORS.inc(where="gmail.get")
     logger.error("Error getting message %s: %s", email_id, e)
     return None
 
 
+@traced("gmail.get_attachment")
 def get_attachment_bytes(email_id: str, attachment_id: str, svc=None) -> Optional[bytes]:
   try:
     svc = svc or get_gmail_service()
-    att = (
-      svc.users().messages().attachments().get(userId="me", messageId=email_id, id=attachment_id).execute()
-    )
+    with UPSTREAM_LATENCY.time(service="gmail", op="attachments.get"):
+      att = (
+        svc.users().messages().attachments().get(userId="me", messageId=email_id, id=attachment_id).execute()
+      )
     data = att.get("data")
     if not data:
       return None
-    return base64.urlsafe_b64decode(data.encode("utf-8"))
+    size = int(att.get("size") or len(data) * 3 // 4)
+    current_span().set("bytes", size)
+    # backstop for a wrong size estimate; attachment_download checks first
+    guards.check_size("attachment", size, MAX_ATTACHMENT_BYTES, "Attachment")
+    with STAGE_LATENCY.time(stage="attachment_decode"):
+      return base64.urlsafe_b64decode(data.encode("utf-8"))
   except HttpError as e:
+    ERRORS.inc(where="gmail.attachment")
     logger.error("Error getting attachment %s for message %s: %s", attachment_id, email_id, e)
     return None
 
 
+def attachment_size(email_id: str, attachment_id: str, svc=None) -> Optional[int]:
+  # From the message metadata, before any download. Gmail attachment ids
+  # change between fetches, so without an exact match the message's
+  # largest attachment is the bound.
+  msg = get_message(email_id, svc=svc)
+  if msg is None or not msg.attachments:
+    return None
+  sizes = {a.id: a.size for a in msg.attachments}
+  return sizes.get(attachment_id, max(sizes.values()))
+
+
+@contextmanager
+def attachment_download(email_id: str, attachment_id: str, svc=None, size_hint: Optional[int] = None,
+                        memory_factor: int = DOWNLOAD_MEMORY_FACTOR) -> Iterator[Optional[bytes]]:
+  """Attachment bytes (None when missing), checked against
+  MAX_ATTACHMENT_BYTES before downloading. The download and the caller's
+  with-block run under ATTACHMENT_GATE. Every attachment path (routes, bot,
+  prefetch) goes through here."""
+  size = size_hint or attachment_size(email_id, attachment_id, svc=svc)
+  guards.check_size("attachment", size, MAX_ATTACHMENT_BYTES, "Attachment")
+  with ATTACHMENT_GATE.admit((size or MAX_ATTACHMENT_BYTES) * memory_factor):
+    yield get_attachment_bytes(email_id, attachment_id, svc=svc)
+
+
 # Simple parser
 KEYWORDS = {
   "quiz": [r"\bquiz\b", r"\btest\b"],
@@ -218,7 +528,78 @@ KEYWORDS = {
   "exam": [r"\bexam\b", r"\bmidterm\b", r"\bfinal\b"],
 }
 
-def parse_items(subject: str, body: Optional[str]) -> List[Dict[str, Any]]:
+# Deadline dates in mail. Numeric dates are read day-first (13/10/2025);
+# a date without a time is taken as 23:59 in APP_TIMEZONE. Month names and
+# full dates win over bare "13/10", which is only taken right after a cue
+# ("due", "on", "by", ...) so fractions like "2/3 problems" are not dates.
+# Only whole month names or their abbreviations count ("marks 10" is not
+# 10 March), and "may" needs a cue or a year.
+try:
+  APP_TZ = ZoneInfo(getattr(settings, "app_timezone", None) or os.environ.get("APP_TIMEZONE") or "UTC")
+except Exception:
+  APP_TZ = ZoneInfo("UTC")
+_MONTHS = {m: i for i, m in enumerate(("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+_MON = (
+  r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?"
+  r"|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)(?:\.|\b)"
+)
+_DATE_ISO = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_DATE_NUM = re.compile(r"\b(\d{1,2})([/.])(\d{1,2})(?:\2(\d{2,4}))?\b")
+_DATE_DMON = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+" + _MON + r"(?:,?\s+(\d{4}))?")
+_DATE_MOND = re.compile(r"\b" + _MON + r"\s+(\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s+(\d{4}))?")
+_DATE_CUE = re.compile(
+  r"\b(due|on|by|before|until|deadline)\b:?(\s+(mon|tues|wednes|thurs|fri|satur|sun)day,?)?\s*$"
+)
+_TIME = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\b|\b([01]?\d|2[0-3]):([0-5]\d)\b")
+DEADLINE_TYPES = ("assignment", "quiz", "exam", "event")
+
+
+def _cued(text: str, m: re.Match, month: str, year: Optional[str]) -> bool:
+  # "may" is a month only with a year or after a cue: "2 may be late"
+  return month != "may" or bool(year) or bool(_DATE_CUE.search(text, max(0, m.start() - 24), m.start()))
+
+
+def extract_due_ts(text: str, ref_ms: Optional[int] = None) -> Optional[int]:
+  ref = datetime.fromtimestamp((ref_ms or time.time() * 1000) / 1000, APP_TZ)
+  found = []  # (rank, start, end, year, month, day); lower rank wins
+  for m in _DATE_ISO.finditer(text):
+    found.append((0, m.start(), m.end(), int(m.group(1)), int(m.group(2)), int(m.group(3))))
+  for m in _DATE_DMON.finditer(text):
+    if _cued(text, m, m.group(2), m.group(3)):
+      found.append((0, m.start(), m.end(), int(m.group(3)) if m.group(3) else None, _MONTHS[m.group(2)[:3]], int(m.group(1))))
+  for m in _DATE_MOND.finditer(text):
+    if _cued(text, m, m.group(1), m.group(3)):
+      found.append((0, m.start(), m.end(), int(m.group(3)) if m.group(3) else None, _MONTHS[m.group(1)[:3]], int(m.group(2))))
+  for m in _DATE_NUM.finditer(text):
+    y = m.group(4)
+    if not y and (m.group(2) == "." or not _DATE_CUE.search(text, max(0, m.start() - 24), m.start())):
+      continue  # "3.14", "v1.2", "2/3 problems"
+    d, mo = int(m.group(1)), int(m.group(3))
+    if mo > 12 and d <= 12:
+      d, mo = mo, d
+    found.append((1 if y else 2, m.start(), m.end(), (int(y) + 2000 if len(y) == 2 else int(y)) if y else None, mo, d))
+  for _, start, end, year, month, day in sorted(found):
+    try:
+      due = datetime(year or ref.year, month, day, 23, 59, tzinfo=APP_TZ)
+      if year is None and due < ref - timedelta(days=30):
+        due = due.replace(year=due.year + 1)  # 29 Feb has no next-year date: skipped
+    except ValueError:
+      continue
+    t = _TIME.search(text, end, end + 40)
+    if t:
+      if t.group(3):
+        hour = int(t.group(1)) % 12 + (12 if t.group(3) == "p" else 0)
+        minute = int(t.group(2) or 0)
+      else:
+        hour, minute = int(t.group(4)), int(t.group(5))
+      if hour < 24 and minute < 60:
+        due = due.replace(hour=hour, minute=minute)
+    return int(due.timestamp() * 1000)
+  return None
+
+
+@STAGE_LATENCY.time(stage="classify")
+def parse_items(subject: str, body: Optional[str], email_id: Optional[str] = None, ref_ms: Optional[int] = None) -> List[ParsedItem]:
   text = f"{subject}\n{body or ''}".lower()
   def detect_type() -> str:
     for t, patterns in KEYWORDS.items():
@@ -226,37 +607,110 @@ def parse_items(subject: str, body: Optional[str]) -> List[Dict[str, Any]]:
         if re.search(pat, text):
           return t
     return "other"
-  item = {
-    "title": subject.strip(),
-    "type": detect_type(),
-    "source": "gmail",
-  }
-  return [item]
+  typ = detect_type()
+  due = extract_due_ts(text, ref_ms) if typ in DEADLINE_TYPES else None
+  return [ParsedItem(title=subject.strip(), type=typ, email_id=email_id, due_ts=due)]
+
+
+def extract_pdf_text(blob: bytes, max_pages: Optional[int] = None) -> tuple[str, int]:
+  # The same handout mailed to a whole class is extracted once
+  content = SHARED.resolve(shared.fingerprint_bytes(blob), "pdf")
+  text, pages = json.loads(SHARED.artifact(
+    content, f"pdf_text:{max_pages}", lambda: json.dumps(_extract_pdf_text(blob, max_pages)),
+  ))
+  return text, pages
+
+
+def load_pdf_text(email_id: str, attachment_id: str, max_pages: Optional[int] = None, svc=None,
+                  size_hint: Optional[int] = None) -> Optional[tuple[str, int]]:
+  """Download and extract one PDF attachment within the byte and page
+  budgets; None when the attachment is missing."""
+  max_pages = min(max_pages or MAX_PDF_PAGES, MAX_PDF_PAGES)
+  with attachment_download(email_id, attachment_id, svc=svc, size_hint=size_hint, memory_factor=PDF_MEMORY_FACTOR) as blob:
+    if not blob:
+      return None
+    return extract_pdf_text(blob, max_pages=max_pages)
+
+
+@traced("pdf.extract")
+@STAGE_LATENCY.time(stage="pdf_extract")
+def _extract_pdf_text(blob: bytes, max_pages: Optional[int] = None) -> tuple[str, int]:
+  from pypdf import PdfReader
+  reader = PdfReader(io.BytesIO(blob))
+  pages = len(reader.pages) if max_pages is None else min(len(reader.pages), max_pages)
+  text = "\n".join((reader.pages[i].extract_text() or "") for i in range(pages))
+  current_span().set("bytes", len(blob)).set("pages", pages).set("chars", len(text))
+  return text, pages
 
 
 # Summarizer
-_openai_client: Optional[OpenAI] = None
+_openai_client: Optional["OpenAI"] = None
 SYSTEM_PROMPT = (
   "You are a concise academic assistant. Summarize documents focusing on deadlines, "
   "requirements, topics. Keep it factual and compact."
 )
 
-def summarize_text(text: str, max_lines: int = 3) -> str:
+# Summary inputs shared by the routes, the bot and the prefetcher, so a
+# precomputed summary has exactly the key a request will ask for.
+SUMMARY_MIN_CHARS = 600  # shorter mail is shown as-is
+# (max pages, clipped chars, summary lines) per surface
+PDF_PRESETS = {"api": (10, 8000, 3), "bot": (5, 3500, 4)}
+PDF_COMBINED = (12000, 5)
+
+
+def email_summary_input(msg: GmailMessage) -> str:
+  subject = (msg.headers.get("Subject") or "").strip()
+  body = (msg.body_text or "").strip()
+  return (subject + "\n\n" + body).strip()
+
+
+def summary_input(text: str) -> str:
+  # What summarize_text actually sends (and keys its artifact on)
+  return text[:MAX_SUMMARY_TOKENS * 4]
+
+
+def summary_fingerprint(clipped: str) -> shared.Fingerprint:
+  return shared.fingerprint_bytes(clipped.encode("utf-8"))
+
+
+def summarize_text(text: str, max_lines: int = 3, share: bool = True) -> str:
+  text = summary_input(text)
+  if not share:
+    return _summarize_openai(text, max_lines)
+  # Keyed on the exact text sent: a summary can quote the greeting, addresses
+  # or links that normalization drops, so only identical copies share one
+  content = SHARED.resolve(summary_fingerprint(text), "summary")
+  return SHARED.artifact(content, f"summary:{max_lines}", lambda: _summarize_openai(text, max_lines))
+
+
+@traced("openai.summarize")
+def _summarize_openai(text: str, max_lines: int = 3) -> str:
   global _openai_client
   if _openai_client is None:
-    _openai_client = OpenAI(api_key=OPENAI_API_KEY)
-  resp = _openai_client.chat.completions.create(
-    model=OPENAI_MODEL,
-    messages=[
-      {"role": "system", "content": SYSTEM_PROMPT},
-      {"role": "user", "content": (
-        f"Summarize the following email/content in at most {max_lines} lines. "
-        "Emphasize dates/deadlines, tasks/requirements, and key topics.\n\n"
-        f"Content:\n{text}"
-      )},
-    ],
-  )
-  return resp.choices[0].message.content.strip()
+    from openai import OpenAI
+    _openai_client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT)
+  with LLM_GATE.admit():
+    try:
+      with UPSTREAM_LATENCY.time(service="openai", op="chat.completions"):
+        resp = _openai_client.chat.completions.create(
+          model=OPENAI_MODEL,
+          messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": (
+              f"Summarize the following email/content in at most {max_lines} lines. "
+              "Emphasize dates/deadlines, tasks/requirements, and key topics.\n\n"
+              f"Content:\n{text}"
+            )},
+          ],
+        )
+    except Exception:
+      ERRORS.inc(where="openai")
+      raise
+  out = resp.choices[0].message.content.strip()
+  usage = getattr(resp, "usage", None)
+  prefetch.charge(getattr(usage, "total_tokens", None) or _token_cost(len(text)))
+  current_span().set("input_chars", len(text)).set("output_chars", len(out))
+  return out
 
 
 # =====================
@@ -310,10 +764,13 @@ def index():
 
 ##teelgram ke liye webhook oaur helper 
 
+@traced("telegram.send")
 def _tg_send(chat_id: int, text: str):
   try:
-    requests.post(f"{TELEGRAM_API_BASE}/sendMessage", json={"chat_id": chat_id, "text": text}, timeout=10)
+    with UPSTREAM_LATENCY.time(service="telegram", op="sendMessage"):
+      requests.post(f"{TELEGRAM_API_BASE}/sendMessage", json={"chat_id": chat_id, "text": text}, timeout=10)
   except Exception as e:
+    ERRORS.inc(where="telegram")
     logger.error("Telegram send failed: %s", e)
 
 
@@ -326,8 +783,18 @@ def telegram_webhook():
   text = (message.get("text") or "").strip()
   if not chat_id:
     return jsonify({"status": "ignored"})
+  current_span().set("telegram.command", text.split(maxsplit=1)[0] if text else "")
+  # Bot commands share the HTTP routes' budgets and gates; a shed command
+  # is answered in the chat (Telegram redelivers updates on non-2xx)
+  guards.set_principal(f"tg:{chat_id}")
+  try:
+    return _telegram_command(chat_id, text)
+  except guards.Rejected as e:
+    _tg_send(chat_id, str(e))
+    return jsonify({"status": "rejected"})
 
-  
+
+def _telegram_command(chat_id: int, text: str):
   tokens = TELEGRAM_CHAT_TOKENS.get(chat_id)
   svc = build_gmail_service_from_tokens_dict(tokens) if tokens else None
 
@@ -373,7 +840,7 @@ def telegram_webhook():
       if not msg: continue
       subject = (msg.headers.get("Subject") or "(no subject)")
       parsed = parse_items(subject, msg.body_text)
-      typ = parsed[0]["type"] if parsed else "other"
+      typ = parsed[0].type if parsed else "other"
       items_lines.append(f"• {typ}: {subject[:60]} ({msg.id[:8]})")
     _tg_send(chat_id, "Synced items:\n" + ("\n".join(items_lines) or "(none)"))
   elif text.startswith("/upcoming"):
@@ -387,8 +854,8 @@ def telegram_webhook():
       subject = msg.headers.get("Subject", "")
       parsed = parse_items(subject, msg.body_text)
       for it in parsed:
-        if it["type"] in ("assignment", "quiz", "exam", "event"):
-          upcoming.append((it["type"], subject, msg.id))
+        if it.type in ("assignment", "quiz", "exam", "event"):
+          upcoming.append((it.type, subject, msg.id))
       if len(upcoming) >= 10:
         break
     lines = [f"• {t}: {s[:55]} ({mid[:8]})" for t,s,mid in upcoming]
@@ -426,7 +893,7 @@ def telegram_webhook():
       else:
         subj = msg.headers.get("Subject", "(no subject)")
         frm = msg.headers.get("From", "?")
-        att_line = f"Attachments: {len(msg.attachments or [])}" if msg.attachments else "No attachments"
+        att_line = f"Attachments: {len(msg.attachments)}" if msg.attachments else "No attachments"
         body_preview = (msg.body_text or "").replace("\n", " ")[:200]
         _tg_send(chat_id, f"Subject: {subj}\nFrom: {frm}\n{att_line}\nBody: {body_preview}{'…' if len(body_preview)==200 else ''}")
   elif text.startswith("/attach"):
@@ -437,11 +904,12 @@ def telegram_webhook():
       _tg_send(chat_id, "Usage: /attach <emailId> <attachmentId>")
     else:
       email_id, att_id = parts[1], parts[2]
-      blob = get_attachment_bytes(email_id, att_id, svc=svc)
-      if blob is None:
+      with attachment_download(email_id, att_id, svc=svc) as blob:
+        size = len(blob) if blob is not None else None
+      if size is None:
         _tg_send(chat_id, "Attachment not found")
       else:
-        _tg_send(chat_id, f"Attachment size: {len(blob)} bytes")
+        _tg_send(chat_id, f"Attachment size: {size} bytes")
   elif text.startswith("/pdfsum"):
     if need_login():
       return jsonify({"status": "ok"})
@@ -456,54 +924,50 @@ def telegram_webhook():
       if not msg:
         _tg_send(chat_id, "Failed to load latest email")
         return jsonify({"status": "ok"})
-      pdfs = []
-      for a in (msg.attachments or []):
-        fname = (a.get("filename") or "").lower()
-        mtype = (a.get("mimeType") or "").lower()
-        if mtype == "application/pdf" or fname.endswith(".pdf"):
-          pdfs.append(a)
+      pdfs = [a for a in msg.attachments if a.is_pdf]
       if not pdfs:
         _tg_send(chat_id, "No PDF attachments in the latest email")
         return jsonify({"status": "ok"})
       lines = [f"Subject: {msg.headers.get('Subject','(no subject)')}"]
       for a in pdfs[:3]:  # show up to 3 pdfs to keep message short
-        att_id = a.get("id")
-        fname = a.get("filename")
-        blob = get_attachment_bytes(msg.id, att_id, svc=svc)
-        if not blob:
-          lines.append(f"• {fname}: (download failed)")
-          continue
+        att_id = a.id
+        fname = a.filename
+        max_pages, clip, lines_n = PDF_PRESETS["bot"]
         try:
-          reader = PdfReader(io.BytesIO(blob))
-          pages = min(len(reader.pages), 5)
-          text = "\n".join((reader.pages[i].extract_text() or "") for i in range(pages))
-          clipped = text[:3500]
-          summary = summarize_text(clipped, max_lines=4)
+          loaded = load_pdf_text(msg.id, att_id, max_pages=max_pages, svc=svc, size_hint=a.size)
+          if loaded is None:
+            lines.append(f"• {fname}: (download failed)")
+            continue
+          text, _ = loaded
+          clipped = text[:clip]
+          summary = summarize_text(clipped, max_lines=lines_n)
           short = summary.replace("\n", " ")
           if len(short) > 350:
             short = short[:350] + "…"
           lines.append(f"• {fname}: {short}")
+        except guards.TooLarge as e:
+          lines.append(f"• {fname}: {e}")
+        except guards.Rejected:
+          raise
         except Exception as e:
           lines.append(f"• {fname}: (failed to read PDF: {e})")
       _tg_send(chat_id, "PDF summaries (latest email):\n" + "\n".join(lines))
     elif len(parts) == 3:
       email_id, att_id = parts[1], parts[2]
-      blob = get_attachment_bytes(email_id, att_id, svc=svc)
-      if blob is None:
-        _tg_send(chat_id, "Attachment not found")
-      else:
-        try:
-          reader = PdfReader(io.BytesIO(blob))
-          text_pages = []
-          for page in reader.pages[:5]:  # limit pages for speed
-            extracted = page.extract_text() or ""
-            if extracted:
-              text_pages.append(extracted)
-          combined = "\n".join(text_pages)[:4000]  # cap length
-          summary = summarize_text(combined, max_lines=4)
+      max_pages, clip, lines_n = PDF_PRESETS["bot"]
+      try:
+        loaded = load_pdf_text(email_id, att_id, max_pages=max_pages, svc=svc)  # limit pages for speed
+        if loaded is None:
+          _tg_send(chat_id, "Attachment not found")
+        else:
+          text, _ = loaded
+          combined = text[:clip]  # cap length
+          summary = summarize_text(combined, max_lines=lines_n)
           _tg_send(chat_id, "PDF summary:\n" + summary)
-        except Exception as e:
-          _tg_send(chat_id, f"Failed to read PDF: {e}")
+      except guards.Rejected:
+        raise
+      except Exception as e:
+        _tg_send(chat_id, f"Failed to read PDF: {e}")
     else:
       _tg_send(chat_id, "Usage: /pdfsum OR /pdfsum <emailId> <attachmentId>")
   else:
@@ -516,23 +980,252 @@ def health():
   return jsonify({"status": "ok"})
 
 
+# Optional subsystems: name -> (loader, module whose presence means loaded)
+SUBSYSTEMS = {
+  "pdf": (lambda: __import__("pypdf"), "pypdf"),
+  "llm": (lambda: __import__("openai"), "openai"),
+  "discovery": (lambda: [discovery_doc(api, v) for api, v in (("gmail", "v1"), ("classroom", "v1"), ("calendar", "v3"))], "googleapiclient.discovery_cache"),
+}
+
+
+def warm_up(names: List[str]) -> None:
+  for name in names:
+    loader = SUBSYSTEMS.get(name)
+    if loader is None:
+      logger.warning("Unknown subsystem to warm: %s", name)
+      continue
+    t0 = time.perf_counter()
+    try:
+      loader[0]()
+    except Exception as e:
+      ERRORS.inc(where="warmup")
+      logger.error("Warming %s failed: %s", name, e)
+      continue
+    STAGE_LATENCY.observe(time.perf_counter() - t0, stage=f"warm_{name}")
+
+
+@app.get("/ready")
+def ready():
+  # Traffic-ready once the local store answers; heavy subsystems load on
+  # first use (or on the warm-up thread) and are reported, not waited for
+  checks = {}
+  try:
+    STORE.ping()
+    checks["store"] = "ok"
+  except Exception as e:
+    checks["store"] = f"error: {e}"
+  ok = all(v == "ok" for v in checks.values())
+  return jsonify({
+    "ready": ok,
+    "checks": checks,
+    "startupMs": STARTUP_MS,
+    "startupBudgetMs": STARTUP_BUDGET_MS,
+    "subsystems": {name: module in sys.modules for name, (_, module) in SUBSYSTEMS.items()},
+    "admission": {gate.kind: gate.status() for gate in (ATTACHMENT_GATE, LLM_GATE)},
+  }), 200 if ok else 503
+
+
+@app.before_request
+def _request_start():
+  route = request.url_rule.rule if request.url_rule else "<unmatched>"
+  g.request_started = time.perf_counter()
+  tokens = session.get("gmail_oauth_tokens")
+  g.principal_token = guards.set_principal(account_key(tokens) if tokens else f"ip:{request.remote_addr}")
+  g.request_span = tracing.begin(
+    f"{request.method} {route}", request.headers.get("traceparent"),
+    **{"http.method": request.method, "http.route": route, "http.request_bytes": request.content_length or 0},
+  )
+
+
+@app.after_request
+def _request_end(response):
+  started = g.pop("request_started", None)
+  if started is not None:
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=request.method, status=str(response.status_code))
+    if response.status_code >= 500:
+      ERRORS.inc(where="http")
+  req_span = g.pop("request_span", None)
+  if req_span is not None:
+    sp, token = req_span
+    sp.set("http.status_code", response.status_code)
+    if not response.is_streamed:
+      sp.set("http.response_bytes", response.calculate_content_length() or 0)
+    tracing.end(sp, token)
+    response.headers["traceparent"] = f"00-{sp.trace_id}-{sp.span_id}-01"
+  return response
+
+
+@app.teardown_request
+def _request_teardown(exc):
+  # after_request is skipped for unhandled exceptions
+  started = g.pop("request_started", None)
+  if exc is not None and started is not None:
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=request.method, status="500")
+    ERRORS.inc(where="http")
+  req_span = g.pop("request_span", None)
+  if req_span is not None:
+    tracing.end(req_span[0], req_span[1], exc)
+  principal_token = g.pop("principal_token", None)
+  if principal_token is not None:
+    guards.reset_principal(principal_token)
+
+
+@app.errorhandler(guards.Rejected)
+def _rejected(e: guards.Rejected):
+  # Budgets (413) and load shedding (429/503) from any route
+  resp = jsonify({"error": str(e), "retryAfter": e.retry_after})
+  resp.status_code = e.status
+  if e.retry_after:
+    resp.headers["Retry-After"] = str(e.retry_after)
+  return resp
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+  return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def _is_admin() -> bool:
+  supplied = request.headers.get("X-Admin-Token") or ""
+  return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+
+@app.before_request
+def _profile_start():
+  mode = request.headers.get("X-Profile")
+  if mode and _is_admin():
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.profile_session = profiling.ProfileSession(mode.lower(), f"{request.method} {route}")
+
+
+@app.after_request
+def _profile_end(response):
+  sess = g.pop("profile_session", None)
+  if sess is not None:
+    meta = sess.stop()
+    response.headers["X-Profile-Id"] = meta["id"]
+  return response
+
+
+@app.post("/admin/profile/poller")
+def admin_profile_poller():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  mode = request.args.get("mode", "sample")
+  profiling.arm_poller(mode)
+  return jsonify({"armed": True, "mode": mode, "note": "next poller sweep will be profiled"})
+
+
+@app.get("/admin/profiles")
+def admin_profiles():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  return jsonify({"dir": profiling.PROFILE_DIR, "profiles": list(profiling.PROFILES)})
+
+
+@app.get("/admin/profiles/<profile_id>")
+def admin_profile_download(profile_id: str):
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  fmt = request.args.get("format", "folded")
+  data = profiling.read_profile(profile_id, fmt)
+  if data is None:
+    return jsonify({"error": "Profile not found"}), 404
+  mimetype = "application/octet-stream" if fmt == "prof" else "text/plain"
+  return Response(data, mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename={profile_id}.{fmt}"})
+
+
+@app.post("/admin/tracemalloc/start")
+def admin_tracemalloc_start():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  try:
+    nframes = int(request.args.get("nframes", 5))
+    interval = float(request.args.get("interval", 60))
+  except ValueError:
+    return jsonify({"error": "nframes and interval must be numeric"}), 400
+  if nframes < 1 or not interval > 0:
+    return jsonify({"error": "nframes must be at least 1 and interval positive"}), 400
+  profiling.start_tracemalloc(nframes=nframes, interval=interval)
+  return jsonify({"tracing": True, "nframes": nframes, "interval": interval})
+
+
+@app.post("/admin/tracemalloc/stop")
+def admin_tracemalloc_stop():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  profiling.stop_tracemalloc()
+  return jsonify({"tracing": False})
+
+
+@app.get("/admin/tracemalloc")
+def admin_tracemalloc():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  try:
+    limit = int(request.args.get("limit", 20))
+  except ValueError:
+    limit = 20
+  return jsonify(profiling.tracemalloc_report(limit=limit, key_type=request.args.get("key", "lineno")))
+
+
+@app.get("/admin/prefetch")
+def admin_prefetch():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  return jsonify(PREFETCHER.status())
+
+
+@app.get("/admin/shared")
+def admin_shared():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  return jsonify(STORE.content_stats())
+
+
+@app.get("/debug/traces/slow")
+def slow_traces():
+  if not _is_admin():
+    return jsonify({"error": "Forbidden"}), 403
+  return jsonify({"thresholdMs": tracing._config["slow_ms"], "traces": list(tracing.SLOW_TRACES)})
+
+
 
 
 @app.get("/auth/google")
 def start_google_oauth():
   base = "https://accounts.google.com/o/oauth2/v2/auth"
-  scope = requests.utils.quote(" ".join(GOOGLE_SCOPES))
+  scope = requests.utils.quote(" ".join(OAUTH_SCOPES))
   tg_id = request.args.get("tg_id")
   state = f"tg:{tg_id}" if tg_id else None
   url = (
     f"{base}?client_id={OAUTH_CLIENT_ID}&redirect_uri={requests.utils.quote(OAUTH_REDIRECT_URI)}"
-    f"&response_type=code&access_type=offline&prompt=consent&scope={scope}"
+    f"&response_type=code&access_type=offline&prompt=consent&include_granted_scopes=true&scope={scope}"
   )
   if state:
     url += f"&state={requests.utils.quote(state)}"
   return redirect(url)
 
 
+def google_account_email(access_token: Optional[str]) -> Optional[str]:
+  # users.getProfile is covered by the Gmail scope every login grants
+  if not access_token:
+    return None
+  try:
+    r = requests.get(
+      "https://gmail.googleapis.com/gmail/v1/users/me/profile",
+      headers={"Authorization": f"Bearer {access_token}"}, timeout=20,
+    )
+    if r.status_code != 200:
+      return None
+    return r.json().get("emailAddress")
+  except Exception as e:
+    logger.error("Gmail profile lookup failed: %s", e)
+    return None
+
+
 @app.get("/auth/google/callback")
 def google_oauth_callback():
   code = request.args.get("code")
@@ -554,12 +1247,17 @@ def google_oauth_callback():
   if resp.status_code != 200:
     return jsonify({"error": "Token exchange failed", "details": resp.text}), 400
   tj = resp.json()
+  email = google_account_email(tj.get("access_token"))
+  if not email:
+    return jsonify({"error": "Could not read the Gmail account address"}), 400
   token_obj = {
     "access_token": tj.get("access_token"),
     "refresh_token": tj.get("refresh_token"),
     "expires_at": int(time.time()) + int(tj.get("expires_in", 0)),
     "scope": tj.get("scope"),
     "token_type": tj.get("token_type"),
+    # account identity (see store.account_key)
+    "email": email,
   }
   # Save in browser session
   session["gmail_oauth_tokens"] = token_obj
@@ -646,55 +1344,123 @@ def is_important_email(subject: str, snippet: str) -> bool:
   return any(k in text for k in IMPORTANT_KEYWORDS)
 
 
+URGENT_KEYWORDS = ("rescheduled", "reschedule", "postponed", "cancelled", "cancellation", "venue", "room change")
+URGENT_WITHIN = 24 * 3600 * 1000
+
+
+def alert_urgency(subject: str, snippet: str, ref_ms: Optional[int] = None) -> str:
+  # Schedule changes and deadlines inside a day skip the digest
+  text = f"{subject}\n{snippet}".lower()
+  if any(k in text for k in URGENT_KEYWORDS):
+    return "high"
+  items = parse_items(subject, snippet, ref_ms=ref_ms)
+  now = ref_ms or int(time.time() * 1000)
+  if items and items[0].due_ts is not None and 0 <= items[0].due_ts - now <= URGENT_WITHIN:
+    return "high"
+  return "normal"
+
+
+# Poller alerts go through the notification engine (see notify.py); the
+# poller only enqueues, delivery and rate limiting happen on its threads.
+SMS_CHANNEL = notify.SmsChannel()
+INAPP_CHANNEL = notify.InAppChannel()
+NOTIFIER = notify.Notifier(
+  STORE,
+  [notify.TelegramChannel(lambda chat_id, text: _tg_send(chat_id, text)), SMS_CHANNEL, notify.WebhookChannel(), INAPP_CHANNEL],
+  default_tz=APP_TZ,
+)
+
+
+_last_poll_completed = time.time()
+POLLER_LAG.set_function(lambda: time.time() - _last_poll_completed)
+
+
+@STAGE_LATENCY.time(stage="poller_sweep")
+def _poll_once():
+  # One root trace per account, not per sweep: a sweep over many accounts
+  # would always be "slow" and its span tree unbounded. The sweep is timed
+  # as a stage and each trace records its place in it.
+  global _last_poll_completed
+  with TOKENS_LOCK:
+    entries = list(TELEGRAM_CHAT_TOKENS.items())
+  QUEUE_DEPTH.set(len(entries), queue="poller_accounts")
+  for i, (chat_id, tokens) in enumerate(entries):
+    QUEUE_DEPTH.dec(queue="poller_accounts")
+    with tracing.span("poller.account", chat_id=chat_id, sweep_index=i, sweep_accounts=len(entries)):
+      _poll_account(chat_id, tokens)
+      account = account_key(tokens)
+      if _sync_due(account):
+        try:
+          sync_account(account, tokens)
+        except Exception as e:
+          ERRORS.inc(where="poller")
+          print(f"[poller] index sync failed for chat {chat_id}: {e}")
+  _last_poll_completed = time.time()
+
+
+def _poll_account(chat_id: int, tokens: Dict[str, Any]):
+  try:
+    svc = build_gmail_service_from_tokens_dict(tokens)
+  except Exception as e:
+    ERRORS.inc(where="poller")
+    print(f"[poller] build service failed for chat {chat_id}: {e}")
+    return
+  if not svc:
+    return
+  try:
+    ids = list_messages(max_results=10, svc=svc)
+  except Exception as e:
+    ERRORS.inc(where="poller")
+    print(f"[poller] list_messages failed for chat {chat_id}: {e}")
+    return
+  if not ids:
+    return
+  account = account_key(tokens)
+  NOTIFIER.link(account, "telegram", str(chat_id))
+  NOTIFIER.link(account, "inapp", account)
+  with NOTIFY_LOCK:
+    seen = NOTIFIED_EMAILS.setdefault(chat_id, set())
+  for mid in ids:
+    if mid in seen:
+      CACHE_HITS.inc(cache="notified")
+      continue
+    CACHE_MISSES.inc(cache="notified")
+    msg = get_message(mid, svc=svc)
+    if not msg:
+      with NOTIFY_LOCK:
+        seen.add(mid)
+      continue
+    subject = msg.headers.get("Subject", "(no subject)")
+    snippet = msg.snippet or (msg.body_text or "")[:140]
+    important = is_important_email(subject, snippet)
+    with NOTIFY_LOCK:
+      seen.add(mid)
+    if important:
+      text = (
+        "📣 Important academic email detected\n"
+        f"Subject: {subject}\n"
+        f"Snippet: {snippet}\n"
+        f"ID: {mid}\n"
+        f"Use /email {mid} to view details."
+      )
+      NOTIFIER.submit(notify.Alert(
+        user=account, summary=f"{subject} (/email {mid})", text=text,
+        urgency=alert_urgency(subject, snippet, msg.internal_date),
+      ))
+
+
 def _polling_loop(interval_seconds: int = 15):
   print("[poller] started")
   while True:
     try:
-      with TOKENS_LOCK:
-        entries = list(TELEGRAM_CHAT_TOKENS.items())
-      for chat_id, tokens in entries:
-        try:
-          svc = build_gmail_service_from_tokens_dict(tokens)
-        except Exception as e:
-          print(f"[poller] build service failed for chat {chat_id}: {e}")
-          continue
-        if not svc:
-          continue
-        try:
-          ids = list_messages(max_results=10, svc=svc)
-        except Exception as e:
-          print(f"[poller] list_messages failed for chat {chat_id}: {e}")
-          continue
-        if not ids:
-          continue
-        with NOTIFY_LOCK:
-          seen = NOTIFIED_EMAILS.setdefault(chat_id, set())
-        for mid in ids:
-          if mid in seen:
-            continue
-          msg = get_message(mid, svc=svc)
-          if not msg:
-            with NOTIFY_LOCK:
-              seen.add(mid)
-            continue
-          subject = msg.headers.get("Subject", "(no subject)")
-          snippet = msg.snippet or (msg.body_text or "")[:140]
-          important = is_important_email(subject, snippet)
-          with NOTIFY_LOCK:
-            seen.add(mid)
-          if important:
-            text = (
-              "📣 Important academic email detected\n"
-              f"Subject: {subject}\n"
-              f"Snippet: {snippet}\n"
-              f"ID: {mid}\n"
-              f"Use /email {mid} to view details."
-            )
-            try:
-              _tg_send(chat_id, text)
-            except Exception as e:
-              print(f"[poller] telegram send failed chat {chat_id} mid {mid}: {e}")
+      mode = profiling.take_poller_arm()
+      if mode:
+        meta = profiling.profile_call(mode, "poller.sweep", _poll_once)
+        print(f"[poller] profiled sweep -> {meta['id']}")
+      else:
+        _poll_once()
     except Exception as e:
+      ERRORS.inc(where="poller")
       print(f"[poller] unexpected error: {e}")
     time.sleep(interval_seconds)
 
@@ -731,41 +1497,427 @@ def refresh_tokens():
   nj = resp.json()
   tokens["access_token"] = nj.get("access_token")
   tokens["expires_at"] = int(time.time()) + int(nj.get("expires_in", 0))
+  tokens["scope"] = nj.get("scope") or tokens.get("scope")
   session["gmail_oauth_tokens"] = tokens
   return jsonify({"status": "refreshed", "expires_at": tokens["expires_at"]})
 
 
-# mail nd attachment
+# =====================
+# Local index (Gmail + Classroom -> STORE)
+# =====================
 
-@app.get("/emails/sync")
-def emails_sync():
-  ids = list_messages(max_results=25)
-  parsed = []
+def _classify(title: str, body: Optional[str]) -> str:
+  items = parse_items(title, body)
+  return items[0].type if items else "other"
+
+
+@traced("index.gmail")
+def ingest_gmail(account: str, svc=None, max_results: int = 100, tokens: Optional[Dict[str, Any]] = None) -> int:
+  # Incremental: only ids the index has not seen are fetched
+  ids = list_messages(max_results=max_results, svc=svc)
+  known = STORE.known_ids(account, "gmail", ids)
+  rows = []
   for mid in ids:
-    msg = get_message(mid)
+    if mid in known:
+      CACHE_HITS.inc(cache="index")
+      continue
+    CACHE_MISSES.inc(cache="index")
+    msg = get_message(mid, svc=svc)
     if not msg:
       continue
-    items = parse_items(msg.headers.get("Subject", "(no subject)"), msg.body_text)
-    for it in items:
-      it["emailId"] = msg.id
-    parsed.extend(items)
-  return jsonify({"fetched": len(ids), "parsed": len(parsed), "items": parsed[:50]})
+    subject = msg.headers.get("Subject", "")
+    flags = {
+      "unread": int("UNREAD" in msg.label_ids),
+      "important": int(is_important_email(subject, msg.snippet or "")),
+    }
+    content = SHARED.resolve(shared.fingerprint_text(f"{subject}\n{msg.body_text or ''}"), "text")
+    SHARED.link(account, "gmail", msg.id, content)
+    parsed = SHARED.artifact(content, "items", lambda: json.dumps([
+      [it.type, it.due_ts] for it in parse_items(subject, msg.body_text, ref_ms=msg.internal_date)
+    ]))
+    for typ, due in json.loads(parsed):
+      rows.append({
+        "account": account, "source": "gmail", "source_id": msg.id, "kind": "email",
+        "title": subject.strip(), "type": typ, "due_ts": due, "sort_ts": msg.internal_date, **flags,
+      })
+      prefetch_message(msg, typ, bool(flags["important"]), tokens)
+  STORE.upsert_items(rows)
+  # read state changes on messages already indexed; ids-only list calls
+  # limited to the indexed window (Gmail "after:" takes epoch seconds, and
+  # is exclusive). Skipped when the list fails, which must not read as
+  # "nothing unread"
+  oldest = STORE.oldest_sort_ts(account, "gmail")
+  if oldest is not None:
+    unread = list_all_message_ids(f"is:unread after:{oldest // 1000 - 1}", svc=svc)
+    if unread is not None:
+      STORE.set_unread(account, "gmail", unread)
+  STORE.set_state(account, "gmail:indexed_at", str(int(time.time())))
+  current_span().set("new", len(rows))
+  return len(rows)
+
+
+def refresh_gmail_index(account: str, svc=None, tokens: Optional[Dict[str, Any]] = None) -> None:
+  indexed_at = int(STORE.get_state(account, "gmail:indexed_at") or 0)
+  if time.time() - indexed_at >= GMAIL_REINDEX_INTERVAL:
+    ingest_gmail(account, svc=svc, tokens=tokens)
+
+
+def sync_account(account: str, tokens: Dict[str, Any], gmail_svc=None) -> Dict[str, int]:
+  out = {"gmail": ingest_gmail(account, svc=gmail_svc or build_gmail_service_from_tokens_dict(tokens), tokens=tokens)}
+  try:
+    csvc = build_classroom_service_from_tokens_dict(tokens)
+    if csvc is not None:
+      out["classroom"] = classroom.sync_account(csvc, STORE, account, _classify)
+  except Exception as e:
+    ERRORS.inc(where="classroom")
+    logger.error("Classroom sync failed for %s: %s", account, e)
+  STORE.set_state(account, "synced_at", str(int(time.time())))
+  CALENDAR_QUEUE.submit(account, tokens)
+  return out
 
 
-@app.get("/emails/upcoming")
-def emails_upcoming():
-  ids = list_messages(max_results=100)
-  out = []
+# Summaries of newly indexed important/deadline mail and its PDFs are
+# computed in the background (see prefetch.py), so the summary routes and
+# bot commands usually find them in the shared artifact store.
+PREFETCHER = prefetch.Prefetcher(
+  daily_tokens=int(getattr(settings, "prefetch_daily_tokens", None) or os.environ.get("PREFETCH_DAILY_TOKENS") or 500000),
+)
+
+
+def _token_cost(chars: int) -> int:
+  # ~4 chars per token in, plus a short completion
+  return chars // 4 + 200
+
+
+def prefetch_message(msg: GmailMessage, typ: str, important: bool, tokens: Optional[Dict[str, Any]] = None) -> None:
+  deadline = typ in DEADLINE_TYPES
+  if not important and not deadline:
+    return
+  priority = 0 if important and deadline else 1
+  text = email_summary_input(msg)
+  fp = summary_fingerprint(summary_input(text))
+  if len(text) > SUMMARY_MIN_CHARS and not SHARED.cached(fp, "summary:3"):
+    # keyed like the summary: identical copies in 200 inboxes are one job
+    PREFETCHER.submit(
+      f"email:{fp.hash}", "email", priority, msg.internal_date, _token_cost(len(summary_input(text))),
+      lambda: summarize_text(text, max_lines=3),
+    )
+  pdfs = [(a.id, a.size) for a in msg.attachments if a.is_pdf]
+  if pdfs and tokens:
+    cost = len(pdfs) * sum(_token_cost(clip) for _, clip, _ in PDF_PRESETS.values()) + _token_cost(PDF_COMBINED[0])
+    PREFETCHER.submit(
+      f"pdf:{msg.id}", "pdf", priority, msg.internal_date, cost,
+      lambda: _prefetch_pdfs(tokens, msg.id, pdfs),
+    )
+
+
+def _prefetch_pdfs(tokens: Dict[str, Any], email_id: str, attachments: List[Tuple[str, int]]) -> None:
+  # Same inputs as /pdfsum and the bot's /pdfsum
+  svc = build_gmail_service_from_tokens_dict(tokens)
+  if svc is None:
+    return
+  api_texts = []
+  for att_id, size in attachments:
+    # one download for both presets
+    try:
+      with attachment_download(email_id, att_id, svc=svc, size_hint=size, memory_factor=PDF_MEMORY_FACTOR) as blob:
+        texts = {
+          preset: extract_pdf_text(blob, max_pages=min(max_pages, MAX_PDF_PAGES))[0]
+          for preset, (max_pages, _, _) in PDF_PRESETS.items()
+        } if blob else {}
+    except guards.TooLarge:
+      continue
+    for preset, text in texts.items():
+      _, clip, lines_n = PDF_PRESETS[preset]
+      summarize_text(text[:clip], max_lines=lines_n)
+      if preset == "api":
+        api_texts.append(text[:clip])
+  if api_texts:
+    summarize_text("\n\n---\n\n".join(api_texts)[:PDF_COMBINED[0]], max_lines=PDF_COMBINED[1])
+
+
+def _sync_due(account: str) -> bool:
+  return time.time() - int(STORE.get_state(account, "synced_at") or 0) >= ACCOUNT_SYNC_INTERVAL
+
+
+@app.post("/classroom/sync")
+def classroom_sync():
+  tokens = session.get("gmail_oauth_tokens")
+  if not tokens:
+    return jsonify({"error": "Not authenticated", "next": "/auth/google"}), 401
+  account = account_key(tokens)
+  return jsonify({"account": account, "ingested": sync_account(account, tokens)})
+
+
+def sync_calendar(account: str, tokens: Dict[str, Any]) -> Optional[Dict[str, int]]:
+  svc = build_calendar_service_from_tokens_dict(tokens)
+  if svc is None:
+    return None
+  return calendar_sync.sync_account(svc, STORE, account, CALENDAR_ID)
+
+
+# deadline -> Calendar pushes run off the request/poller threads
+CALENDAR_QUEUE = calendar_sync.SyncQueue(sync_calendar)
+
+
+@app.post("/calendar/sync")
+def calendar_sync_route():
+  tokens = session.get("gmail_oauth_tokens")
+  if not tokens:
+    return jsonify({"error": "Not authenticated", "next": "/auth/google"}), 401
+  account = account_key(tokens)
+  if request.args.get("wait") in ("1", "true"):
+    return jsonify({"account": account, "calendar": sync_calendar(account, tokens)})
+  return jsonify({"account": account, "queued": CALENDAR_QUEUE.submit(account, tokens)}), 202
+
+
+@app.get("/calendar/status")
+def calendar_status():
+  account = account_key(session.get("gmail_oauth_tokens"))
+  last = STORE.get_state(account, "calendar:last")
+  return jsonify({
+    "calendarId": CALENDAR_ID,
+    "syncedAt": int(STORE.get_state(account, "calendar:synced_at") or 0) or None,
+    "last": json.loads(last) if last else None,
+  })
+
+
+@app.get("/classroom/courses")
+def classroom_courses():
+  account = account_key(session.get("gmail_oauth_tokens"))
+  return jsonify({"courses": [
+    {"id": c["course_id"], "name": c["name"], "section": c["section"], "updateTime": c["update_time"]}
+    for c in STORE.courses(account)
+  ]})
+
+
+@app.get("/notifications")
+def notifications_inbox():
+  account = account_key(session.get("gmail_oauth_tokens"))
+  return jsonify({"notifications": INAPP_CHANNEL.inbox(account)[::-1]})
+
+
+@app.route("/notifications/rules", methods=["GET", "PUT"])
+def notification_rules():
+  tokens = session.get("gmail_oauth_tokens")
+  if not tokens:
+    return jsonify({"error": "Not authenticated", "next": "/auth/google"}), 401
+  account = account_key(tokens)
+  if request.method == "PUT":
+    try:
+      NOTIFIER.set_rules(account, notify.Rules.from_dict(request.get_json(silent=True) or {}))
+    except (ValueError, TypeError, KeyError) as e:
+      return jsonify({"error": f"Invalid rules: {e}"}), 400
+  return jsonify({"account": account, "rules": NOTIFIER.rules(account).to_dict(), "channels": sorted(NOTIFIER.channels)})
+
+
+# mail nd attachment
+
+# Listing cursors are opaque to clients: "<kind>:<value>" base64url encoded,
+# kind "g" wraps a Gmail nextPageToken, kind "s" a local store position.
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(kind: str, value: str) -> str:
+  return base64.urlsafe_b64encode(f"{kind}:{value}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+  raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+  kind, sep, value = raw.partition(":")
+  if not sep or not value:
+    raise ValueError("malformed cursor")
+  return kind, value
+
+
+def _page_args(default_limit: int, kinds: Tuple[str, ...] = ("g",)) -> Tuple[Optional[str], Optional[str], int]:
+  # -> (cursor kind, cursor value, limit); ValueError on a bad cursor/limit
+  limit = int(request.args.get("limit", default_limit))
+  if limit < 1:
+    raise ValueError("limit must be >= 1")
+  cursor = request.args.get("cursor")
+  kind = value = None
+  if cursor:
+    kind, value = decode_cursor(cursor)
+    if kind not in kinds:
+      raise ValueError("unknown cursor kind")
+  return kind, value, min(limit, MAX_PAGE_SIZE)
+
+
+def _wants_ndjson() -> bool:
+  return request.args.get("format") == "ndjson" or request.accept_mimetypes.best == "application/x-ndjson"
+
+
+def _fetch_page(page_token: Optional[str], limit: int, default_subject: str, svc=None) -> Tuple[MessageBatch, int, Optional[str]]:
+  ids, next_token = list_messages_page(max_results=limit, page_token=page_token, svc=svc)
+  batch = MessageBatch()
   for mid in ids:
-    msg = get_message(mid)
+    msg = get_message(mid, svc=svc)
     if not msg:
       continue
-    subject = msg.headers.get("Subject", "")
-    items = parse_items(subject, msg.body_text)
-    for it in items:
-      it["emailId"] = msg.id
-      out.append(it)
-  return jsonify({"upcoming": out[:50]})
+    for it in parse_items(msg.headers.get("Subject", default_subject), msg.body_text):
+      batch.append(msg, it)
+  return batch, len(ids), next_token
+
+
+def _stream_pages(page_token: Optional[str], limit: int, default_subject: str) -> Response:
+  # One page in memory at a time; the client reads until the stream ends.
+  svc = get_gmail_service()
+
+  def generate():
+    token = page_token
+    while True:
+      batch, _, token = _fetch_page(token, limit, default_subject, svc=svc)
+      for item in batch.items():
+        yield json.dumps(item) + "\n"
+      if not token:
+        break
+
+  return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.get("/emails/sync")
+def emails_sync():
+  try:
+    _, page_token, limit = _page_args(25)
+  except ValueError as e:
+    return jsonify({"error": f"Invalid cursor/limit: {e}"}), 400
+  if _wants_ndjson():
+    return _stream_pages(page_token, limit, "(no subject)")
+  batch, fetched, next_token = _fetch_page(page_token, limit, "(no subject)")
+  return jsonify({
+    "fetched": fetched,
+    "parsed": len(batch),
+    "items": list(batch.items()),
+    "nextCursor": encode_cursor("g", next_token) if next_token else None,
+  })
+
+
+def _feed_item(row) -> Dict[str, Any]:
+  if row["source"] == "gmail":
+    item = {"title": row["title"], "type": row["type"], "source": "gmail", "emailId": row["source_id"]}
+  else:
+    item = {
+      "title": row["title"], "type": row["type"], "source": row["source"],
+      "courseId": row["course_id"], "itemId": row["source_id"].split("/", 1)[-1], "kind": row["kind"], "link": row["link"],
+    }
+  if row["due_ts"]:
+    item["dueAt"] = row["due_ts"]
+  return item
+
+
+def _feed_position(row) -> str:
+  return f"{row['sort_ts']}:{row['source']}:{row['source_id']}"
+
+
+def _parse_feed_position(value: str) -> Tuple[int, str, str]:
+  sort_ts, source, source_id = value.split(":", 2)
+  return int(sort_ts), source, source_id
+
+
+@app.get("/emails/upcoming")
+def emails_upcoming():
+  # Served from the local index (Gmail + Classroom)
+  try:
+    kind, value, limit = _page_args(50, kinds=("s",))
+    after = _parse_feed_position(value) if kind == "s" else None
+  except ValueError as e:
+    return jsonify({"error": f"Invalid cursor/limit: {e}"}), 400
+  account = account_key(session.get("gmail_oauth_tokens"))
+  if after is None:
+    refresh_gmail_index(account, tokens=session.get("gmail_oauth_tokens"))
+  if _wants_ndjson():
+    def generate():
+      pos = after
+      while True:
+        rows = STORE.feed(account, after=pos, limit=500)
+        for row in rows:
+          yield json.dumps(_feed_item(row)) + "\n"
+        if len(rows) < 500:
+          break
+        pos = _parse_feed_position(_feed_position(rows[-1]))
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+  rows = STORE.feed(account, after=after, limit=limit)
+  return jsonify({
+    "upcoming": [_feed_item(r) for r in rows],
+    "nextCursor": encode_cursor("s", _feed_position(rows[-1])) if len(rows) == limit else None,
+  })
+
+
+# Dashboard snapshot. Counts come from the trigger-maintained agg_counts
+# table; the ETag covers the account's agg_version and its next deadline, so
+# an unchanged dashboard is a 304 after two indexed lookups.
+DASHBOARD_DEADLINES = 10
+# account -> (etag, body) for the default ?deadlines only, least recently
+# used first
+SNAPSHOT_CACHE_SIZE = int(getattr(settings, "snapshot_cache_size", None) or os.environ.get("SNAPSHOT_CACHE_SIZE") or 1000)
+_SNAPSHOTS: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def _snapshot_etag(account: str, deadlines: int, now_ms: int) -> str:
+  key = f"{account}:{deadlines}:{STORE.agg_version(account)}:{STORE.next_due(account, now_ms)}"
+  return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def build_dashboard_snapshot(account: str, deadlines: int, now_ms: int) -> Dict[str, Any]:
+  totals: Dict[str, int] = {}
+  per_course: Dict[str, Dict[str, int]] = {}
+  for row in STORE.agg_counts(account):
+    bucket = totals if row["course_id"] == "" else per_course.setdefault(row["course_id"], {})
+    bucket[row["type"]] = row["n"]
+  names = {c["course_id"]: c["name"] for c in STORE.courses(account)}
+  unread_count, unread_rows = STORE.unread_important(account, 5)
+  return {
+    "account": account,
+    "generatedAt": now_ms,
+    "counts": totals,
+    "total": sum(totals.values()),
+    "courses": sorted(
+      ({"id": cid, "name": names.get(cid), "counts": counts, "total": sum(counts.values())} for cid, counts in per_course.items()),
+      key=lambda c: -c["total"],
+    ),
+    "deadlines": [_feed_item(r) for r in STORE.upcoming_deadlines(account, now_ms, deadlines)],
+    "unreadImportant": {"count": unread_count, "items": [_feed_item(r) for r in unread_rows]},
+  }
+
+
+@app.get("/dashboard/snapshot")
+def dashboard_snapshot():
+  account = account_key(session.get("gmail_oauth_tokens"))
+  try:
+    deadlines = max(1, min(int(request.args.get("deadlines", DASHBOARD_DEADLINES)), MAX_PAGE_SIZE))
+  except ValueError:
+    return jsonify({"error": "Invalid deadlines"}), 400
+  if request.args.get("refresh") in ("1", "true"):
+    refresh_gmail_index(account, tokens=session.get("gmail_oauth_tokens"))
+  now_ms = int(time.time() * 1000)
+  etag = _snapshot_etag(account, deadlines, now_ms)
+  headers = {"Cache-Control": "private, no-cache"}
+  if request.if_none_match.contains(etag):
+    CACHE_HITS.inc(cache="dashboard")
+    resp = Response(status=304, headers=headers)
+    resp.set_etag(etag)
+    return resp
+  with _SNAPSHOTS_LOCK:
+    cached = _SNAPSHOTS.get(account) if deadlines == DASHBOARD_DEADLINES else None
+    if cached is not None:
+      _SNAPSHOTS.move_to_end(account)
+  if cached is not None and cached[0] == etag:
+    CACHE_HITS.inc(cache="dashboard")
+    body = cached[1]
+  else:
+    CACHE_MISSES.inc(cache="dashboard")
+    body = json.dumps(build_dashboard_snapshot(account, deadlines, now_ms)).encode()
+    if deadlines == DASHBOARD_DEADLINES:
+      with _SNAPSHOTS_LOCK:
+        _SNAPSHOTS[account] = (etag, body)
+        _SNAPSHOTS.move_to_end(account)
+        while len(_SNAPSHOTS) > SNAPSHOT_CACHE_SIZE:
+          _SNAPSHOTS.popitem(last=False)
+  resp = Response(body, mimetype="application/json", headers=headers)
+  resp.set_etag(etag)
+  return resp
 
 
 @app.get("/emails/search")
@@ -782,10 +1934,9 @@ def emails_search():
       continue
     subject = msg.headers.get("Subject", "")
     if query.lower() in subject.lower():
-      items = parse_items(subject, msg.body_text)
-      first = items[0] if items else {"title": subject}
-      first["emailId"] = msg.id
-      first["attachments"] = [att.get("filename") for att in (msg.attachments or [])]
+      items = parse_items(subject, msg.body_text, email_id=msg.id)
+      first = items[0].to_dict() if items else {"title": subject, "emailId": msg.id}
+      first["attachments"] = [att.filename for att in msg.attachments]
       return jsonify({"result": first})
   return jsonify({"result": None})
 
@@ -796,23 +1947,24 @@ def email_detail(email_id: str):
   if not msg:
     return jsonify({"error": "Email not found"}), 404
   items = parse_items(msg.headers.get("Subject", "(no subject)"), msg.body_text)
-  summary = items[0] if items else None
+  summary = items[0].to_dict() if items else None
   return jsonify({
     "id": msg.id,
     "subject": msg.headers.get("Subject"),
     "from": msg.headers.get("From"),
     "date": msg.headers.get("Date"),
-    "attachments": msg.attachments or [],
+    "attachments": [a.to_dict() for a in msg.attachments],
     "parsed": summary,
   })
 
 
 @app.get("/attachments/<email_id>/<attachment_id>")
 def download_attachment(email_id: str, attachment_id: str):
-  blob = get_attachment_bytes(email_id, attachment_id)
-  if blob is None:
+  with attachment_download(email_id, attachment_id) as blob:
+    size = len(blob) if blob is not None else None
+  if size is None:
     return jsonify({"error": "Attachment not found"}), 404
-  return jsonify({"emailId": email_id, "attachmentId": attachment_id, "size": len(blob)})
+  return jsonify({"emailId": email_id, "attachmentId": attachment_id, "size": size})
 
 
 @app.post("/attachments/summarize/pdf")
@@ -822,16 +1974,17 @@ def summarize_pdf():
   attachment_id = data.get("attachment_id")
   if not email_id or not attachment_id:
     return jsonify({"error": "email_id and attachment_id required"}), 400
-  blob = get_attachment_bytes(email_id, attachment_id)
-  if blob is None:
-    return jsonify({"error": "Attachment not found"}), 404
   try:
-    reader = PdfReader(io.BytesIO(blob))
-    text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    loaded = load_pdf_text(email_id, attachment_id)
+  except guards.Rejected:
+    raise
   except Exception as e:
     return jsonify({"error": f"Failed to read PDF: {e}"}), 400
+  if loaded is None:
+    return jsonify({"error": "Attachment not found"}), 404
+  text, pages = loaded
   summary = summarize_text(text, max_lines=3)
-  return jsonify({"summary": summary, "chars": len(text)})
+  return jsonify({"summary": summary, "chars": len(text), "pages_used": pages})
 
 
 # pdf summareize krna hai
@@ -849,13 +2002,7 @@ def pdfsum_latest_email():
       return jsonify({"error": "Failed to load latest email"}), 404
     subject = msg.headers.get("Subject", "(no subject)")
     # Filter PDF attachments
-    atts = msg.attachments or []
-    pdf_atts = []
-    for a in atts:
-      fname = (a.get("filename") or "").lower()
-      mtype = (a.get("mimeType") or "").lower()
-      if mtype == "application/pdf" or fname.endswith(".pdf"):
-        pdf_atts.append(a)
+    pdf_atts = [a for a in msg.attachments if a.is_pdf]
     if not pdf_atts:
       return jsonify({
         "emailId": msg.id,
@@ -867,22 +2014,28 @@ def pdfsum_latest_email():
     items = []
     combined_texts = []
     for a in pdf_atts:
-      att_id = a.get("id")
-      fname = a.get("filename")
-      blob = get_attachment_bytes(msg.id, att_id, svc=svc)
-      if not blob:
-        items.append({"filename": fname, "attachmentId": att_id, "error": "download_failed"})
-        continue
+      att_id = a.id
+      fname = a.filename
+      max_pages, clip, lines_n = PDF_PRESETS["api"]
       try:
-        reader = PdfReader(io.BytesIO(blob))
-        pages = min(len(reader.pages), 10)
-        text = "\n".join((reader.pages[i].extract_text() or "") for i in range(pages))
+        loaded = load_pdf_text(msg.id, att_id, max_pages=max_pages, svc=svc, size_hint=a.size)
+      except guards.TooLarge as e:
+        items.append({"filename": fname, "attachmentId": att_id, "error": str(e)})
+        continue
+      except guards.Rejected:
+        raise
       except Exception as e:
         items.append({"filename": fname, "attachmentId": att_id, "error": f"pdf_read_failed: {e}"})
         continue
-      clipped = text[:8000]  # safety cap
+      if loaded is None:
+        items.append({"filename": fname, "attachmentId": att_id, "error": "download_failed"})
+        continue
+      text, pages = loaded
+      clipped = text[:clip]  # safety cap
       try:
-        summary = summarize_text(clipped, max_lines=3)
+        summary = summarize_text(clipped, max_lines=lines_n)
+      except guards.Rejected:
+        raise
       except Exception as e:
         summary = f"(summarization failed: {e})"
       items.append({
@@ -896,8 +2049,10 @@ def pdfsum_latest_email():
     combined_summary = None
     try:
       if combined_texts:
-        joined = "\n\n---\n\n".join(combined_texts)[:12000]
-        combined_summary = summarize_text(joined, max_lines=5)
+        joined = "\n\n---\n\n".join(combined_texts)[:PDF_COMBINED[0]]
+        combined_summary = summarize_text(joined, max_lines=PDF_COMBINED[1])
+    except guards.Rejected:
+      raise
     except Exception as e:
       combined_summary = f"(combined summarization failed: {e})"
     return jsonify({
@@ -907,6 +2062,8 @@ def pdfsum_latest_email():
       "items": items,
       "combined_summary": combined_summary,
     })
+  except guards.Rejected:
+    raise
   except Exception as e:
     return jsonify({"error": str(e)}), 500
 
@@ -924,15 +2081,17 @@ def summarize_post():
     max_lines = 3
   if not text and not email_id:
     return jsonify({"error": "Provide either 'email_id' or 'text'"}), 400
-  if not text and email_id:
+  # mail is shared content; text posted by the caller is not kept
+  from_email = not text
+  if from_email:
     msg = get_message(email_id)
     if not msg:
       return jsonify({"error": "Email not found"}), 404
-    subject = msg.headers.get("Subject", "") or ""
-    body = msg.body_text or ""
-    text = (subject + "\n\n" + body).strip()
+    text = email_summary_input(msg)
   try:
-    summary = summarize_text(text, max_lines=max_lines)
+    summary = summarize_text(text, max_lines=max_lines, share=from_email)
+  except guards.Rejected:
+    raise
   except Exception as e:
     return jsonify({"error": f"Summarization failed: {e}"}), 500
   return jsonify({
@@ -956,10 +2115,12 @@ def summarize_latest():
       continue
     subject = (msg.headers.get("Subject") or "").strip()
     body = (msg.body_text or "").strip()
-    text = (subject + "\n\n" + body).strip()
-    if len(text) > 600:
+    text = email_summary_input(msg)
+    if len(text) > SUMMARY_MIN_CHARS:
       try:
         s = summarize_text(text, max_lines=3)
+      except guards.Rejected:
+        raise
       except Exception as e:
         s = f"(summarization failed: {e})"
     else:
@@ -976,6 +2137,13 @@ def summarize_latest():
   return jsonify({"count": len(out), "items": out})
 
 
+STARTUP_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+if STARTUP_MS > STARTUP_BUDGET_MS:
+  logger.warning("app import took %.0f ms (budget %.0f ms)", STARTUP_MS, STARTUP_BUDGET_MS)
+if WARM_SUBSYSTEMS:
+  threading.Thread(target=warm_up, args=(WARM_SUBSYSTEMS,), name="warm-up", daemon=True).start()
+
+
 if __name__ == "__main__":
   ensure_poller_thread()
   app.run(host="0.0.0.0", port=5000, debug=True)
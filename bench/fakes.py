@@ -0,0 +1,404 @@
+from __future__ import annotations
+import base64
+import copy
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+# Offline stand-ins for Gmail, Classroom, Calendar, OpenAI and Telegram. The
+# Google APIs and OpenAI are replaced at the client-object level (the app only
+# ever calls `.execute()` / `.chat.completions.create()` on them); Telegram is
+# a real local HTTP server because the app talks to it with plain `requests`.
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_cassette(path: Optional[str] = None, rebase: bool = True) -> List[Dict[str, Any]]:
+  with open(path or os.path.join(FIXTURES, "gmail_messages.json"), encoding="utf-8") as f:
+    messages = json.load(f)["messages"]
+  return rebase_messages(messages) if rebase else messages
+
+
+# Recorded mail carries fixed dates; deadlines in it would fall behind the
+# Calendar sync window (and out of /upcoming) as the fixture ages. Shift
+# every date by whole weeks (weekday names stay right) so the newest
+# message is from the last seven days.
+_MON_NAMES = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_MON = "(" + "|".join(_MON_NAMES) + ")"
+_DATES = re.compile(
+  r"\b(?P<nd>\d{1,2})/(?P<nm>\d{1,2})/(?P<ny>\d{4})\b"
+  r"|\b(?P<dd>\d{1,2}) " + _MON.replace("(", "(?P<dm>", 1) + r" (?P<dy>\d{4})\b"
+  r"|\b" + _MON.replace("(", "(?P<mm>", 1) + r" (?P<md>\d{1,2})\b"
+)
+
+
+def _shift_dates(text: str, delta: timedelta, year: int) -> str:
+  def sub(m: re.Match) -> str:
+    try:
+      if m.group("nd"):
+        d = datetime(int(m.group("ny")), int(m.group("nm")), int(m.group("nd"))) + delta
+        return f"{d.day:02d}/{d.month:02d}/{d.year}"
+      if m.group("dd"):
+        d = datetime(int(m.group("dy")), _MON_NAMES.index(m.group("dm")) + 1, int(m.group("dd"))) + delta
+        return f"{d.day} {_MON_NAMES[d.month - 1]} {d.year}"
+      d = datetime(year, _MON_NAMES.index(m.group("mm")) + 1, int(m.group("md"))) + delta
+      return f"{_MON_NAMES[d.month - 1]} {d.day}"
+    except ValueError:
+      return m.group(0)
+  return _DATES.sub(sub, text)
+
+
+def rebase_messages(messages: List[Dict[str, Any]], now: Optional[float] = None) -> List[Dict[str, Any]]:
+  newest = max((int(m.get("internalDate", 0)) for m in messages), default=0)
+  weeks = int(((now or time.time()) * 1000 - newest) // (7 * 86400000))
+  if not newest or weeks <= 0:
+    return messages
+  delta = timedelta(weeks=weeks)
+  year = datetime.fromtimestamp(newest / 1000, timezone.utc).year
+
+  def walk(part: Dict[str, Any]):
+    for h in part.get("headers", []):
+      h["value"] = _shift_dates(h.get("value") or "", delta, year)
+    body = part.get("body") or {}
+    if body.get("data"):
+      text = base64.urlsafe_b64decode(body["data"] + "==").decode("utf-8", "replace")
+      body["data"] = base64.urlsafe_b64encode(_shift_dates(text, delta, year).encode()).decode()
+    for child in part.get("parts", []):
+      walk(child)
+
+  for m in messages:
+    m["internalDate"] = str(int(m.get("internalDate", 0)) + int(delta.total_seconds() * 1000))
+    m["snippet"] = _shift_dates(m.get("snippet") or "", delta, year)
+    walk(m.get("payload") or {})
+  return messages
+
+
+def make_pdf(pages: int = 3, lines_per_page: int = 40) -> bytes:
+  # Smallest well-formed PDF pypdf will extract text from: one Helvetica
+  # font object shared by `pages` content streams.
+  objs: List[bytes] = []
+  kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+  objs.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+  objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+  objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+  for p in range(pages):
+    ops = ["BT /F1 10 Tf 40 800 Td 12 TL"]
+    for ln in range(lines_per_page):
+      ops.append(f"(Week {p + 1} line {ln}: assignment due 17/10/2025, quiz on recursion and graphs.) '")
+    ops.append("ET")
+    stream = "\n".join(ops).encode()
+    objs.append(
+      f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * p} 0 R >>".encode()
+    )
+    objs.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+  out = bytearray(b"%PDF-1.4\n")
+  offsets = []
+  for i, body in enumerate(objs, start=1):
+    offsets.append(len(out))
+    out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+  xref = len(out)
+  out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+  for off in offsets:
+    out += f"{off:010d} 00000 n \n".encode()
+  out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+  return bytes(out)
+
+
+class _Call:
+  def __init__(self, latency: float, fn):
+    self._latency = latency
+    self._fn = fn
+
+  def execute(self):
+    if self._latency:
+      time.sleep(self._latency)
+    return self._fn()
+
+
+class FakeGmail:
+  """Replays cassette messages as a mailbox of `count` synthetic messages."""
+
+  def __init__(self, count: int = 100, latency: float = 0.0, cassette: Optional[List[Dict[str, Any]]] = None, pdf: Optional[bytes] = None):
+    self.latency = latency
+    templates = cassette or load_cassette()
+    self.mailbox: Dict[str, Dict[str, Any]] = {}
+    self.order: List[str] = []
+    for i in range(count):
+      msg = copy.deepcopy(templates[i % len(templates)])
+      mid = f"{msg['id'][:10]}{i:06x}"
+      msg["id"] = msg["threadId"] = mid
+      msg["internalDate"] = str(int(msg.get("internalDate", 0)) - i * 60000)
+      self.mailbox[mid] = msg
+      self.order.append(mid)
+    self.attachment_data = base64.urlsafe_b64encode(pdf or make_pdf()).decode()
+    self.calls: Dict[str, int] = {}
+
+  def _count(self, op: str):
+    self.calls[op] = self.calls.get(op, 0) + 1
+
+  # Resource chain: svc.users().messages().attachments()
+  def users(self):
+    return self
+
+  def messages(self):
+    return self
+
+  def attachments(self):
+    return self
+
+  def list(self, userId: str = "me", q: Optional[str] = None, maxResults: int = 100, pageToken: Optional[str] = None, **_):
+    self._count("list")
+    ids = self.order
+    if q and q.startswith("is:unread"):
+      ids = [m for m in ids if "UNREAD" in self.mailbox[m].get("labelIds", ())]
+      after = re.search(r"\bafter:(\d+)", q)
+      if after:
+        ids = [m for m in ids if int(self.mailbox[m].get("internalDate", 0)) > int(after.group(1)) * 1000]
+    elif q:
+      needle = q.lower()
+      ids = [m for m in ids if needle in self._subject(self.mailbox[m]).lower()]
+    start = int(pageToken or 0)
+    page = ids[start:start + maxResults]
+    resp: Dict[str, Any] = {"messages": [{"id": m, "threadId": m} for m in page], "resultSizeEstimate": len(ids)}
+    if start + maxResults < len(ids):
+      resp["nextPageToken"] = str(start + maxResults)
+    return _Call(self.latency, lambda: resp)
+
+  def get(self, userId: str = "me", id: Optional[str] = None, messageId: Optional[str] = None, **_):
+    if messageId is not None:
+      self._count("attachments.get")
+      size = len(self.attachment_data) * 3 // 4
+      return _Call(self.latency, lambda: {"size": size, "data": self.attachment_data})
+    self._count("get")
+    return _Call(self.latency, lambda: copy.deepcopy(self.mailbox[id]))
+
+  @staticmethod
+  def _subject(msg: Dict[str, Any]) -> str:
+    for h in msg.get("payload", {}).get("headers", []):
+      if h.get("name") == "Subject":
+        return h.get("value") or ""
+    return ""
+
+
+class FakeOpenAI:
+  def __init__(self, latency: float = 0.0):
+    self.latency = latency
+    self.calls = 0
+    self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+  def _create(self, model=None, messages=None, **_):
+    self.calls += 1
+    if self.latency:
+      time.sleep(self.latency)
+    content = (messages or [{}])[-1].get("content", "")
+    summary = f"Summary ({len(content)} chars): deadlines and tasks extracted."
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=summary))])
+
+
+class FakeTelegram:
+  """Local HTTP server answering the Bot API methods the app uses."""
+
+  def __init__(self, latency: float = 0.0):
+    self.latency = latency
+    self.sent: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    outer = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def _reply(self, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = json.loads(self.rfile.read(length) or b"{}")
+        if outer.latency:
+          time.sleep(outer.latency)
+        with lock:
+          outer.sent.append(data)
+        self._reply({"ok": True, "result": {"message_id": len(outer.sent)}})
+
+      def do_GET(self):
+        self._reply({"ok": True, "result": True})
+
+      def log_message(self, *args):
+        pass
+
+    self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    self._server.daemon_threads = True
+    self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}/botTEST"
+    self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+  def start(self) -> "FakeTelegram":
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+
+
+class _FakeBatch:
+  def __init__(self, latency: float, callback):
+    self._latency = latency
+    self._callback = callback
+    self._requests: List[Any] = []
+
+  def add(self, call: _Call, request_id: str):
+    self._requests.append((request_id, call))
+
+  def execute(self):
+    if self._latency:
+      time.sleep(self._latency)
+    for request_id, call in self._requests:
+      self._callback(request_id, call._fn(), None)
+
+
+def _ymd(d: datetime) -> Dict[str, int]:
+  return {"year": d.year, "month": d.month, "day": d.day}
+
+
+class FakeClassroom:
+  """Classroom v1 with `courses` courses of `items` entries per collection."""
+
+  def __init__(self, courses: int = 6, items: int = 30, latency: float = 0.0):
+    self.latency = latency
+    self.calls: Dict[str, int] = {}
+    # dates relative to today, so coursework stays upcoming and inside the
+    # Calendar sync window
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def stamp(days_ago: int, hour: int, minute: int = 0) -> str:
+      return (today - timedelta(days=days_ago, hours=-hour, minutes=-minute)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    self.courses_data = [
+      {"id": f"c{c}", "name": f"Course {c}", "section": f"S{c % 3}", "courseState": "ACTIVE", "updateTime": stamp(30, 10)}
+      for c in range(courses)
+    ]
+    self.entries: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for c in self.courses_data:
+      cid = c["id"]
+      work = [{
+        "id": f"w{i}", "courseId": cid, "title": f"{c['name']} homework {i}" if i % 3 else f"{c['name']} quiz {i}",
+        "description": "Submit on the portal.", "workType": "ASSIGNMENT",
+        "dueDate": _ymd(today + timedelta(days=1 + i % 28)), "dueTime": {"hours": 18, "minutes": 30},
+        "updateTime": stamp(i % 28, 9, i % 60), "alternateLink": f"https://classroom.google.com/c/{cid}/a/w{i}",
+      } for i in range(items)]
+      ann = [{
+        "id": f"a{i}", "courseId": cid, "text": f"Seminar on chapter {i} this week\nDetails inside.",
+        "updateTime": stamp(28 + i % 28, 8), "alternateLink": f"https://classroom.google.com/c/{cid}/p/a{i}",
+      } for i in range(items)]
+      mats = [{
+        "id": f"m{i}", "courseId": cid, "title": f"Lecture notes {i}",
+        "updateTime": stamp(56 + i % 28, 8), "alternateLink": f"https://classroom.google.com/c/{cid}/m/m{i}",
+      } for i in range(items)]
+      for lst in (work, ann, mats):
+        lst.sort(key=lambda e: e["updateTime"], reverse=True)
+      self.entries[cid] = {"courseWork": work, "announcements": ann, "courseWorkMaterial": mats}
+
+  def _count(self, op: str):
+    self.calls[op] = self.calls.get(op, 0) + 1
+
+  def new_batch_http_request(self, callback=None):
+    self._count("batch")
+    return _FakeBatch(self.latency, callback)
+
+  def courses(self):
+    return _FakeCourses(self)
+
+
+class _FakeCourses:
+  def __init__(self, owner: FakeClassroom):
+    self._owner = owner
+
+  def list(self, courseStates=None, pageSize: int = 100, pageToken: Optional[str] = None, **_):
+    self._owner._count("courses.list")
+    return _Call(self._owner.latency, lambda: {"courses": self._owner.courses_data})
+
+  def _collection(self, key: str):
+    owner = self._owner
+
+    class _Collection:
+      def list(self, courseId: str, pageSize: int = 50, pageToken: Optional[str] = None, **_):
+        owner._count(f"{key}.list")
+        entries = owner.entries[courseId][key]
+        start = int(pageToken or 0)
+        resp: Dict[str, Any] = {key: entries[start:start + pageSize]}
+        if start + pageSize < len(entries):
+          resp["nextPageToken"] = str(start + pageSize)
+        return _Call(owner.latency, lambda: resp)
+
+    return _Collection()
+
+  def courseWork(self):
+    return self._collection("courseWork")
+
+  def announcements(self):
+    return self._collection("announcements")
+
+  def courseWorkMaterials(self):
+    return self._collection("courseWorkMaterial")
+
+
+class _HttpStatusError(Exception):
+  def __init__(self, status: int):
+    super().__init__(f"HTTP {status}")
+    self.resp = SimpleNamespace(status=status)
+
+
+class FakeCalendar:
+  """Calendar v3 events.insert/update, batched like FakeClassroom."""
+
+  def __init__(self, latency: float = 0.0):
+    self.latency = latency
+    self.calls: Dict[str, int] = {}
+    self.events_data: Dict[str, Dict[str, Any]] = {}
+
+  def _count(self, op: str):
+    self.calls[op] = self.calls.get(op, 0) + 1
+
+  def new_batch_http_request(self, callback=None):
+    self._count("batch")
+    return _FakeCalendarBatch(self.latency, callback)
+
+  def events(self):
+    return self
+
+  def insert(self, calendarId: str, body: Dict[str, Any], **_):
+    def run():
+      self._count("events.insert")
+      if body["id"] in self.events_data:
+        raise _HttpStatusError(409)
+      self.events_data[body["id"]] = body
+      return body
+    return _Call(self.latency, run)
+
+  def update(self, calendarId: str, eventId: str, body: Dict[str, Any], **_):
+    def run():
+      self._count("events.update")
+      if eventId not in self.events_data:
+        raise _HttpStatusError(404)
+      self.events_data[eventId] = dict(body, id=eventId)
+      return self.events_data[eventId]
+    return _Call(self.latency, run)
+
+
+class _FakeCalendarBatch(_FakeBatch):
+  def execute(self):
+    if self._latency:
+      time.sleep(self._latency)
+    for request_id, call in self._requests:
+      try:
+        self._callback(request_id, call._fn(), None)
+      except _HttpStatusError as e:
+        self._callback(request_id, None, e)
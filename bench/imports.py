@@ -0,0 +1,71 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Import profile of `import app` in a fresh interpreter (-X importtime).
+#   python -m bench.imports --budget-ms 500 --runs 3
+# Exits 1 when the best run is over budget or a lazily loaded subsystem
+# got imported eagerly, so it can gate CI.
+
+LAZY_MODULES = ("openai", "pypdf", "googleapiclient.discovery", "google.oauth2.credentials", "google.oauth2.service_account")
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_once(module: str) -> List[Dict[str, Any]]:
+  proc = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+    cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))),
+  )
+  if proc.returncode != 0:
+    raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+  rows = []
+  for line in proc.stderr.splitlines():
+    m = _LINE.match(line)
+    if m:
+      rows.append({"module": m.group(4), "self_us": int(m.group(1)), "cumulative_us": int(m.group(2)), "depth": len(m.group(3)) // 2})
+  return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description="Import-time profile of the backend")
+  parser.add_argument("--module", default="app")
+  parser.add_argument("--runs", type=int, default=3, help="best of N (first run warms the bytecode cache)")
+  parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS") or 500))
+  parser.add_argument("--top", type=int, default=15)
+  parser.add_argument("--out")
+  args = parser.parse_args(argv)
+
+  best: Optional[List[Dict[str, Any]]] = None
+  best_total = 0
+  for _ in range(max(1, args.runs)):
+    rows = profile_once(args.module)
+    total = next((r["cumulative_us"] for r in rows if r["module"] == args.module and r["depth"] == 0), 0)
+    if best is None or total < best_total:
+      best, best_total = rows, total
+  assert best is not None
+
+  direct = sorted((r for r in best if r["depth"] == 1), key=lambda r: -r["cumulative_us"])
+  eager = [m for m in LAZY_MODULES if any(r["module"] == m for r in best)]
+  total_ms = best_total / 1000
+  print(f"import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+  for r in direct[:args.top]:
+    print(f"  {r['cumulative_us'] / 1000:>8.1f} ms  {r['module']}")
+  if eager:
+    print("eagerly imported: " + ", ".join(eager))
+  if args.out:
+    with open(args.out, "w", encoding="utf-8") as f:
+      json.dump({"module": args.module, "total_ms": total_ms, "budget_ms": args.budget_ms, "eager": eager,
+                 "direct": direct}, f, indent=2)
+  return 1 if total_ms > args.budget_ms or eager else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,127 @@
+from __future__ import annotations
+import argparse
+import base64
+import gc
+import json
+import os
+import re
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+  sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeGmail  # noqa: E402
+
+
+# Bytes retained per cached message, old representation vs the current one.
+#   python -m bench.memory --messages 5000
+
+
+@dataclass
+class LegacyGmailMessage:
+  # GmailMessage as it was before the compact record: full header dict,
+  # eagerly decoded body, attachment dicts.
+  id: str
+  thread_id: str
+  snippet: str
+  internal_date: int
+  headers: Dict[str, str]
+  body_text: Optional[str] = None
+  attachments: Optional[List[Dict[str, Any]]] = None
+
+
+def _legacy_from_raw(raw: Dict[str, Any]) -> LegacyGmailMessage:
+  payload = raw.get("payload", {})
+  body = None
+  candidates = [payload] + list(payload.get("parts") or [])
+  for p in candidates:
+    if p.get("mimeType") in ("text/plain", "text/html") and p.get("body", {}).get("data"):
+      body = base64.urlsafe_b64decode(p["body"]["data"]).decode(errors="ignore")
+      if p.get("mimeType") == "text/html":
+        body = re.sub(r"<[^>]+>", " ", body)
+      break
+  atts = [
+    {"id": p["body"]["attachmentId"], "filename": p.get("filename"), "mimeType": p.get("mimeType")}
+    for p in (payload.get("parts") or []) if p.get("filename") and (p.get("body") or {}).get("attachmentId")
+  ]
+  return LegacyGmailMessage(
+    id=raw.get("id"),
+    thread_id=raw.get("threadId"),
+    snippet=raw.get("snippet", ""),
+    internal_date=int(raw.get("internalDate", 0)),
+    headers={h.get("name"): h.get("value") for h in payload.get("headers", [])},
+    body_text=body,
+    attachments=atts,
+  )
+
+
+def _retained(build: Callable[[], Any]) -> int:
+  gc.collect()
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  kept = build()
+  gc.collect()
+  after = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  del kept
+  return after - before
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description="Per-message memory of cached Gmail messages")
+  parser.add_argument("--messages", type=int, default=2000)
+  parser.add_argument("--out")
+  args = parser.parse_args(argv)
+
+  import app as backend
+  mailbox = FakeGmail(args.messages)
+  raws = [mailbox.mailbox[m] for m in mailbox.order]
+  n = len(raws)
+
+  # each record is built from a fresh copy of the API response, so only
+  # what the record itself keeps alive is counted
+  def legacy_items():
+    return [_legacy_from_raw(json.loads(json.dumps(r))) for r in raws]
+
+  def compact_items():
+    return [backend.message_from_raw(json.loads(json.dumps(r))) for r in raws]
+
+  def legacy_listing():
+    out = []
+    for r in raws:
+      item = {"title": backend.MessageHeaders(r["payload"]["headers"]).get("Subject", ""), "type": "quiz", "source": "gmail"}
+      item["emailId"] = r["id"]
+      out.append(item)
+    return out
+
+  def batch_listing():
+    batch = backend.MessageBatch()
+    for r in raws:
+      msg = backend.message_from_raw(r)
+      batch.append(msg, backend.ParsedItem(title=msg.headers.get("Subject", ""), type="quiz"))
+    return batch
+
+  report = {
+    "messages": n,
+    "bytes_per_message": {
+      "legacy_dataclass": round(_retained(legacy_items) / n, 1),
+      "compact_record": round(_retained(compact_items) / n, 1),
+    },
+    "bytes_per_listed_item": {
+      "dict_per_item": round(_retained(legacy_listing) / n, 1),
+      "message_batch": round(_retained(batch_listing) / n, 1),
+    },
+  }
+  print(json.dumps(report, indent=2))
+  if args.out:
+    with open(args.out, "w", encoding="utf-8") as f:
+      json.dump(report, f, indent=2)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
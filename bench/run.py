@@ -0,0 +1,245 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+  sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeCalendar, FakeClassroom, FakeGmail, FakeOpenAI, FakeTelegram, load_cassette, make_pdf  # noqa: E402
+
+
+# Usage (from the repo root, with the backend's normal .env/config available):
+#   python -m bench.run --gmail-ms 40 --openai-ms 400 --accounts 50
+#   python -m bench.run --compare bench/results/<old-sha>.json
+# Every scenario drives the real Flask routes through the WSGI test client,
+# with Gmail/OpenAI/Telegram swapped for the offline fakes in bench/fakes.py.
+
+
+def _peak_rss_mb() -> float:
+  # Lifetime peak of the whole process, not of any one scenario
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is KiB on Linux, bytes on macOS
+  return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _rss_mb() -> float:
+  # Current resident set; falls back to the peak where /proc is missing
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+  except (OSError, ValueError, IndexError):
+    return _peak_rss_mb()
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+  if not samples:
+    return 0.0
+  ordered = sorted(samples)
+  k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+  return ordered[k]
+
+
+def _git_sha() -> Optional[str]:
+  try:
+    return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+  except Exception:
+    return None
+
+
+def _measure(name: str, fn: Callable[[], Any], iterations: int, warmup: int = 1,
+             reset: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+  # `reset` runs untimed before every call, warm-up included
+  rss_before = _rss_mb()
+  for _ in range(warmup):
+    if reset:
+      reset()
+    fn()
+  samples: List[float] = []
+  errors = 0
+  busy = 0.0
+  for _ in range(iterations):
+    if reset:
+      reset()
+    t0 = time.perf_counter()
+    try:
+      ok = fn()
+    except Exception:
+      ok = False
+    samples.append(time.perf_counter() - t0)
+    busy += samples[-1]
+    if ok is False:
+      errors += 1
+  return {
+    "name": name,
+    "iterations": iterations,
+    "errors": errors,
+    "throughput_rps": round(iterations / busy, 3) if busy else None,
+    "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+    "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+    "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+    # resident memory this scenario left behind (warm-up included)
+    "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+  }
+
+
+class Harness:
+  def __init__(self, args: argparse.Namespace):
+    self._tmp = tempfile.TemporaryDirectory(prefix="acadify-bench-")
+    os.environ["ACADIFY_DB"] = os.path.join(self._tmp.name, "bench.db")
+    import app as backend
+    self.app = backend
+    self.args = args
+    cassette = load_cassette(args.cassette) if args.cassette else None
+    pdf = make_pdf(pages=args.pdf_pages)
+    self.gmail = FakeGmail(args.mailbox, args.gmail_ms / 1000.0, cassette, pdf)
+    self.classroom = FakeClassroom(args.courses, latency=args.gmail_ms / 1000.0)
+    self.calendar = FakeCalendar(latency=args.gmail_ms / 1000.0)
+    self.openai = FakeOpenAI(args.openai_ms / 1000.0)
+    self.telegram = FakeTelegram(args.telegram_ms / 1000.0).start()
+
+    backend.app.secret_key = backend.app.secret_key or "bench"
+    backend.app.testing = True
+    backend.get_gmail_service = lambda: self.gmail
+    backend.build_gmail_service_from_tokens_dict = lambda tokens: self.gmail if tokens else None
+    backend.build_classroom_service_from_tokens_dict = lambda tokens: self.classroom if tokens else None
+    backend.build_calendar_service_from_tokens_dict = lambda tokens: self.calendar if tokens else None
+    backend._openai_client = self.openai
+    backend.TELEGRAM_API_BASE = self.telegram.base_url
+    self.client = backend.app.test_client()
+    with self.client.session_transaction() as sess:
+      sess["gmail_oauth_tokens"] = {"access_token": "bench", "refresh_token": "bench", "email": "bench@bench.test"}
+    self.chat_id = 424242
+    backend.TELEGRAM_CHAT_TOKENS[self.chat_id] = {"access_token": "bench", "refresh_token": "bench", "email": "bench@bench.test"}
+
+  def close(self):
+    self.telegram.stop()
+    self._tmp.cleanup()
+
+  def reset_shared(self):
+    # Shared summaries and PDF text persist across calls; without this every
+    # LLM/PDF scenario is a cache hit after the warm-up and measures nothing
+    # of the real pipeline. The mail index and calendar mirror are kept.
+    conn = self.app.STORE._conn()
+    with conn:
+      for table in ("artifacts", "content_links", "content_alias", "content_bands", "content"):
+        conn.execute(f"DELETE FROM {table}")
+
+  def get(self, path: str) -> Callable[[], bool]:
+    return lambda: self.client.get(path).status_code < 400
+
+  def post(self, path: str, payload: Dict[str, Any]) -> Callable[[], bool]:
+    return lambda: self.client.post(path, json=payload).status_code < 400
+
+  def command(self, text: str) -> Callable[[], bool]:
+    update = {"message": {"chat": {"id": self.chat_id}, "text": text}}
+    return lambda: self.client.post("/telegram/webhook", json=update).status_code < 400
+
+  def poller_sweep(self, accounts: int) -> Callable[[], bool]:
+    backend = self.app
+    tokens = {cid: {"access_token": f"bench-{cid}", "refresh_token": f"bench-{cid}", "email": f"student{cid}@bench.test"} for cid in range(1, accounts + 1)}
+
+    def sweep():
+      with backend.TOKENS_LOCK:
+        backend.TELEGRAM_CHAT_TOKENS.clear()
+        backend.TELEGRAM_CHAT_TOKENS.update(tokens)
+      with backend.NOTIFY_LOCK:
+        backend.NOTIFIED_EMAILS.clear()
+      backend._poll_once()
+      return True
+    return sweep
+
+  def scenarios(self) -> Dict[str, Callable[[], bool]]:
+    first = self.gmail.order[0]
+    att = "ANGjdJ_assignment3"
+    return {
+      "GET /emails/sync": self.get("/emails/sync"),
+      "GET /emails/upcoming": self.get("/emails/upcoming"),
+      "GET /dashboard/snapshot": self.get("/dashboard/snapshot"),
+      "POST /classroom/sync": self.post("/classroom/sync", {}),
+      "POST /calendar/sync?wait=1": self.post("/calendar/sync?wait=1", {}),
+      "GET /pdfsum": self.get("/pdfsum"),
+      "GET /summarize": self.get("/summarize"),
+      "POST /summarize (email_id)": self.post("/summarize", {"email_id": first}),
+      "POST /attachments/summarize/pdf": self.post("/attachments/summarize/pdf", {"email_id": first, "attachment_id": att}),
+      "webhook /summarize": self.command("/summarize"),
+      "webhook /sync": self.command("/sync"),
+      "webhook /upcoming": self.command("/upcoming"),
+      "webhook /search": self.command("/search midterm"),
+      "webhook /email": self.command(f"/email {first}"),
+      "webhook /pdfsum": self.command("/pdfsum"),
+      f"poller sweep x{self.args.accounts} accounts": self.poller_sweep(self.args.accounts),
+    }
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+  with open(baseline_path, encoding="utf-8") as f:
+    baseline = json.load(f)
+  base = {r["name"]: r for r in baseline["results"]}
+  print(f"\nvs {baseline_path} (commit {baseline.get('commit')})")
+  for r in current["results"]:
+    b = base.get(r["name"])
+    if not b:
+      continue
+    delta = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100 if b["p50_ms"] else 0.0
+    print(f"  {r['name']:<40} p50 {b['p50_ms']:>9.2f} -> {r['p50_ms']:>9.2f} ms ({delta:+.1f}%)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description="Offline benchmark for the Flask backend")
+  parser.add_argument("--iterations", type=int, default=20)
+  parser.add_argument("--mailbox", type=int, default=100, help="synthetic messages per fake mailbox")
+  parser.add_argument("--accounts", type=int, default=25, help="accounts in the poller sweep")
+  parser.add_argument("--courses", type=int, default=6, help="courses in the fake Classroom account")
+  parser.add_argument("--pdf-pages", type=int, default=5)
+  parser.add_argument("--gmail-ms", type=float, default=0.0, help="injected latency per Gmail call")
+  parser.add_argument("--openai-ms", type=float, default=0.0, help="injected latency per OpenAI call")
+  parser.add_argument("--telegram-ms", type=float, default=0.0, help="injected latency per Telegram call")
+  parser.add_argument("--cassette", help="recorded Gmail messages (format=full JSON) to replay")
+  parser.add_argument("--only", help="substring filter on scenario names")
+  parser.add_argument("--out", help="result file (default bench/results/<git sha>.json)")
+  parser.add_argument("--compare", help="previous result file to diff p50 against")
+  args = parser.parse_args(argv)
+
+  harness = Harness(args)
+  results = []
+  try:
+    for name, fn in harness.scenarios().items():
+      if args.only and args.only not in name:
+        continue
+      iterations = max(1, args.iterations // 5) if name.startswith("poller") else args.iterations
+      r = _measure(name, fn, iterations, reset=harness.reset_shared)
+      results.append(r)
+      print(f"{name:<40} {r['throughput_rps']:>9} rps  p50 {r['p50_ms']:>9.2f} ms  p99 {r['p99_ms']:>9.2f} ms  rss {r['rss_delta_mb']:+.1f} MB")
+  finally:
+    harness.close()
+
+  report = {
+    "commit": _git_sha(),
+    "timestamp": int(time.time()),
+    "python": platform.python_version(),
+    "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    "upstream_calls": {"gmail": harness.gmail.calls, "classroom": harness.classroom.calls, "calendar": harness.calendar.calls, "openai": harness.openai.calls, "telegram": len(harness.telegram.sent)},
+    "process_peak_rss_mb": round(_peak_rss_mb(), 1),
+    "results": results,
+  }
+  out = args.out or os.path.join(ROOT, "bench", "results", f"{report['commit'] or 'local'}.json")
+  os.makedirs(os.path.dirname(out), exist_ok=True)
+  with open(out, "w", encoding="utf-8") as f:
+    json.dump(report, f, indent=2)
+  print(f"\nprocess peak rss {report['process_peak_rss_mb']} MB\nwrote {out}")
+  if args.compare:
+    compare(report, args.compare)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import ERRORS, QUEUE_DEPTH, UPSTREAM_LATENCY
+from store import Store
+from tracing import span
+
+
+# Mirrors deadline items from the local index into a Google Calendar.
+# Event ids are derived from the source item, so a re-sync updates the same
+# event instead of creating a duplicate; each event body is hashed and only
+# items whose hash changed since the last sync are sent, in batched HTTP
+# requests of BATCH_SIZE.
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_SCOPE = "https://www.googleapis.com/auth/calendar.events"
+
+BATCH_SIZE = 50
+EVENT_MINUTES = 60
+LOOKBACK_DAYS = 7  # deadlines older than this are left alone
+
+
+def event_id(source: str, source_id: str) -> str:
+  # Calendar ids are base32hex ([a-v0-9]), 5-1024 chars; a hex digest fits
+  return hashlib.sha1(f"{source}:{source_id}".encode()).hexdigest()
+
+
+def _rfc3339(ms: int) -> str:
+  return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def event_body(row) -> Dict[str, Any]:
+  due = int(row["due_ts"])
+  start = due - EVENT_MINUTES * 60 * 1000
+  description = f"{row['type'].capitalize()} from {row['source'].capitalize()}"
+  if row["link"]:
+    description += f"\n{row['link']}"
+  return {
+    "summary": f"[{row['type']}] {row['title']}"[:250],
+    "description": description,
+    "start": {"dateTime": _rfc3339(start)},
+    "end": {"dateTime": _rfc3339(due)},
+    "reminders": {"useDefault": True},
+    "extendedProperties": {"private": {"acadifySource": row["source"], "acadifySourceId": row["source_id"]}},
+  }
+
+
+def body_hash(body: Dict[str, Any]) -> str:
+  return hashlib.sha1(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _status(exception) -> Optional[int]:
+  resp = getattr(exception, "resp", None)
+  return getattr(resp, "status", None)
+
+
+def _run_batches(svc, calendar_id: str, ops: List[Tuple[str, str, Dict[str, Any], str]]):
+  # ops: (verb, event_id, body, hash); returns (done, retry)
+  done: List[Tuple[str, str]] = []
+  retry: List[Tuple[str, str, Dict[str, Any], str]] = []
+  events = svc.events()
+  for i in range(0, len(ops), BATCH_SIZE):
+    chunk = ops[i:i + BATCH_SIZE]
+
+    def callback(request_id, response, exception, _chunk=chunk):
+      verb, eid, body, h = _chunk[int(request_id)]
+      if exception is None:
+        done.append((eid, h))
+        return
+      status = _status(exception)
+      # the local mirror was out of step with the calendar: flip the verb once
+      if verb == "insert" and status == 409:
+        retry.append(("update", eid, body, h))
+      elif verb == "update" and status in (404, 410):
+        retry.append(("insert", eid, body, h))
+      else:
+        ERRORS.inc(where="calendar")
+        logger.error("Calendar %s failed for event %s: %s", verb, eid, exception)
+
+    batch = svc.new_batch_http_request(callback=callback)
+    for n, (verb, eid, body, _) in enumerate(chunk):
+      if verb == "insert":
+        req = events.insert(calendarId=calendar_id, body=dict(body, id=eid))
+      else:
+        req = events.update(calendarId=calendar_id, eventId=eid, body=body)
+      batch.add(req, request_id=str(n))
+    with UPSTREAM_LATENCY.time(service="calendar", op="batch"):
+      batch.execute()
+  return done, retry
+
+
+# One sync per account at a time: the queue worker, ?wait=1 requests and
+# the poller can all reach the same account, and two overlapping syncs
+# would both insert every new event (the loser retrying as updates)
+_account_locks: Dict[str, threading.Lock] = {}
+_account_locks_lock = threading.Lock()
+
+
+def _account_lock(account: str) -> threading.Lock:
+  with _account_locks_lock:
+    return _account_locks.setdefault(account, threading.Lock())
+
+
+def sync_account(svc, store: Store, account: str, calendar_id: str = "primary") -> Dict[str, int]:
+  with _account_lock(account), span("calendar.sync", account=account) as sp:
+    since = int((datetime.now(timezone.utc) - timedelta(days=LOOKBACK_DAYS)).timestamp() * 1000)
+    known = store.calendar_hashes(account)
+    ops: List[Tuple[str, str, Dict[str, Any], str]] = []
+    unchanged = 0
+    for row in store.deadlines(account, since):
+      eid = event_id(row["source"], row["source_id"])
+      body = event_body(row)
+      h = body_hash(body)
+      if known.get(eid) == h:
+        unchanged += 1
+        continue
+      ops.append(("update" if eid in known else "insert", eid, body, h))
+
+    done, retry = _run_batches(svc, calendar_id, ops)
+    if retry:
+      more, _ = _run_batches(svc, calendar_id, retry)
+      done += more
+    now = int(time.time())
+    store.put_calendar_events(account, done, now)
+    result = {"sent": len(ops), "written": len(done), "unchanged": unchanged, "failed": len(ops) - len(done)}
+    store.set_state(account, "calendar:synced_at", str(now))
+    store.set_state(account, "calendar:last", json.dumps(result))
+    sp.set("sent", len(ops)).set("unchanged", unchanged).set("failed", result["failed"])
+    return result
+
+
+class SyncQueue:
+  """Background worker running `job(account, tokens)` once per queued account.
+
+  An account already waiting in the queue is not queued again; its tokens
+  are replaced with the newest ones instead.
+  """
+
+  def __init__(self, job: Callable[[str, Dict[str, Any]], Any], name: str = "calendar"):
+    self._job = job
+    self._name = name
+    self._queue: "queue.Queue[str]" = queue.Queue()
+    self._pending: Dict[str, Dict[str, Any]] = {}
+    self._lock = threading.Lock()
+    self._thread: Optional[threading.Thread] = None
+
+  def submit(self, account: str, tokens: Dict[str, Any]) -> bool:
+    with self._lock:
+      queued = account not in self._pending
+      self._pending[account] = tokens
+      if queued:
+        self._queue.put(account)
+        QUEUE_DEPTH.inc(queue=self._name)
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    return queued
+
+  def _run(self):
+    while True:
+      account = self._queue.get()
+      with self._lock:
+        tokens = self._pending.pop(account, None)
+        QUEUE_DEPTH.dec(queue=self._name)
+      if tokens is None:
+        continue
+      try:
+        self._job(account, tokens)
+      except Exception as e:
+        ERRORS.inc(where=self._name)
+        logger.error("%s sync failed for %s: %s", self._name, account, e)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from metrics import ADMISSION, QUEUE_DEPTH
+
+
+# Admission control for heavy work (attachment download + PDF extraction,
+# LLM calls). Each kind has a slot limit; PDF work also reserves its byte
+# size against a shared memory budget. A request that cannot be admitted
+# within the wait timeout is shed with 503; one principal (session account
+# or Telegram chat) holding too many slots of a kind gets 429. Background
+# work (no principal) waits longer and leaves `reserve` slots free for
+# interactive requests.
+
+_principal: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("acadify_principal", default=None)
+
+
+class Rejected(Exception):
+  status = 503
+  retry_after: Optional[int] = None
+
+  def __init__(self, message: str, retry_after: Optional[int] = None):
+    super().__init__(message)
+    self.retry_after = retry_after
+
+
+class Overloaded(Rejected):
+  status = 503
+
+
+class RateLimited(Rejected):
+  status = 429
+
+
+class TooLarge(Rejected):
+  status = 413
+
+
+def set_principal(principal: Optional[str]) -> contextvars.Token:
+  return _principal.set(principal)
+
+
+def reset_principal(token: contextvars.Token) -> None:
+  _principal.reset(token)
+
+
+def principal() -> Optional[str]:
+  return _principal.get()
+
+
+class Gate:
+  def __init__(self, kind: str, slots: int, per_principal: int, memory_bytes: int = 0,
+               wait: float = 2.0, background_wait: float = 300.0, reserve: int = 1):
+    self.kind = kind
+    self.slots = slots
+    self.per_principal = per_principal
+    self.memory_bytes = memory_bytes
+    self.wait = wait
+    self.background_wait = background_wait
+    self.reserve = min(reserve, slots - 1)
+    self._cond = threading.Condition()
+    self._in_use = 0
+    self._bytes = 0
+    self._by_principal: Dict[str, int] = {}
+
+  def _fits(self, weight: int, background: bool) -> bool:
+    limit = self.slots - (self.reserve if background else 0)
+    if self._in_use >= limit:
+      return False
+    return not self.memory_bytes or self._in_use == 0 or self._bytes + weight <= self.memory_bytes
+
+  @contextmanager
+  def admit(self, weight: int = 0) -> Iterator[None]:
+    who = principal()
+    background = who is None
+    weight = min(weight, self.memory_bytes) if self.memory_bytes else 0
+    deadline = time.monotonic() + (self.background_wait if background else self.wait)
+    with self._cond:
+      if not background and self._by_principal.get(who, 0) >= self.per_principal:
+        ADMISSION.inc(kind=self.kind, reason="principal")
+        raise RateLimited(f"Too many {self.kind} jobs in progress for you; wait for them to finish", retry_after=5)
+      QUEUE_DEPTH.inc(queue=f"admission_{self.kind}")
+      try:
+        while not self._fits(weight, background):
+          remaining = deadline - time.monotonic()
+          if remaining <= 0:
+            ADMISSION.inc(kind=self.kind, reason="busy")
+            raise Overloaded(f"Server busy with other {self.kind} work; try again shortly", retry_after=10)
+          self._cond.wait(remaining)
+      finally:
+        QUEUE_DEPTH.dec(queue=f"admission_{self.kind}")
+      self._in_use += 1
+      self._bytes += weight
+      if who is not None:
+        self._by_principal[who] = self._by_principal.get(who, 0) + 1
+    try:
+      yield
+    finally:
+      with self._cond:
+        self._in_use -= 1
+        self._bytes -= weight
+        if who is not None:
+          left = self._by_principal.get(who, 1) - 1
+          if left:
+            self._by_principal[who] = left
+          else:
+            self._by_principal.pop(who, None)
+        self._cond.notify_all()
+
+  def status(self) -> Dict[str, int]:
+    with self._cond:
+      return {"inUse": self._in_use, "slots": self.slots, "bytes": self._bytes, "memoryBytes": self.memory_bytes}
+
+
+def check_size(kind: str, size: Optional[int], limit: int, what: str) -> None:
+  if limit and size is not None and size > limit:
+    ADMISSION.inc(kind=kind, reason="size")
+    raise TooLarge(f"{what} is too large ({size // 1024} KB, limit {limit // 1024} KB)")
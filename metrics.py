@@ -0,0 +1,220 @@
+from __future__ import annotations
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Prometheus text exposition without the client dependency. Every metric keeps
+# its samples in a dict keyed by the label-value tuple, guarded by one lock, so
+# the hot path is a dict lookup plus an add.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _fmt(v: float) -> str:
+  if v == float("inf"):
+    return "+Inf"
+  if float(v).is_integer():
+    return str(int(v))
+  return repr(float(v))
+
+
+def _escape(v: str) -> str:
+  return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+  kind = "untyped"
+
+  def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+    self.name = name
+    self.help = help_text
+    self.labelnames = tuple(labelnames)
+    self._lock = threading.Lock()
+
+  def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+  def _labelstr(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+    if extra:
+      pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+  def render(self) -> List[str]:
+    return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+  def _samples(self) -> List[str]:
+    return []
+
+
+class Counter(_Metric):
+  kind = "counter"
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._values: Dict[Tuple[str, ...], float] = {}
+
+  def inc(self, amount: float = 1.0, **labels: str) -> None:
+    key = self._key(labels)
+    with self._lock:
+      self._values[key] = self._values.get(key, 0.0) + amount
+
+  def value(self, **labels: str) -> float:
+    return self._values.get(self._key(labels), 0.0)
+
+  def _samples(self) -> List[str]:
+    with self._lock:
+      items = list(self._values.items())
+    return [f"{self.name}{self._labelstr(k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+  kind = "gauge"
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._values: Dict[Tuple[str, ...], float] = {}
+    self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+  def set(self, value: float, **labels: str) -> None:
+    key = self._key(labels)
+    with self._lock:
+      self._values[key] = float(value)
+
+  def inc(self, amount: float = 1.0, **labels: str) -> None:
+    key = self._key(labels)
+    with self._lock:
+      self._values[key] = self._values.get(key, 0.0) + amount
+
+  def dec(self, amount: float = 1.0, **labels: str) -> None:
+    self.inc(-amount, **labels)
+
+  def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+    # Evaluated at scrape time, for values that are cheaper to read than to track.
+    with self._lock:
+      self._functions[self._key(labels)] = fn
+
+  def value(self, **labels: str) -> float:
+    key = self._key(labels)
+    fn = self._functions.get(key)
+    return float(fn()) if fn else self._values.get(key, 0.0)
+
+  def _samples(self) -> List[str]:
+    with self._lock:
+      items = dict(self._values)
+      fns = list(self._functions.items())
+    for key, fn in fns:
+      try:
+        items[key] = float(fn())
+      except Exception:
+        continue
+    return [f"{self.name}{self._labelstr(k)} {_fmt(v)}" for k, v in items.items()]
+
+
+class Histogram(_Metric):
+  kind = "histogram"
+
+  def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+    super().__init__(name, help_text, labelnames)
+    self.buckets = tuple(sorted(buckets))
+    # per label set: [bucket counts..., +Inf count], sum
+    self._data: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+  def observe(self, value: float, **labels: str) -> None:
+    key = self._key(labels)
+    idx = bisect.bisect_left(self.buckets, value)
+    with self._lock:
+      entry = self._data.get(key)
+      if entry is None:
+        entry = ([0] * (len(self.buckets) + 1), [0.0])
+        self._data[key] = entry
+      entry[0][idx] += 1
+      entry[1][0] += value
+
+  @contextmanager
+  def time(self, **labels: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(time.perf_counter() - start, **labels)
+
+  def count(self, **labels: str) -> int:
+    entry = self._data.get(self._key(labels))
+    return sum(entry[0]) if entry else 0
+
+  def _samples(self) -> List[str]:
+    with self._lock:
+      items = [(k, list(c), s[0]) for k, (c, s) in self._data.items()]
+    out: List[str] = []
+    for key, counts, total in items:
+      cumulative = 0
+      for bound, n in zip(self.buckets + (float("inf"),), counts):
+        cumulative += n
+        out.append(f"{self.name}_bucket{self._labelstr(key, ('le', _fmt(bound)))} {cumulative}")
+      out.append(f"{self.name}_sum{self._labelstr(key)} {_fmt(total)}")
+      out.append(f"{self.name}_count{self._labelstr(key)} {cumulative}")
+    return out
+
+
+class Registry:
+  def __init__(self):
+    self._metrics: Dict[str, _Metric] = {}
+    self._lock = threading.Lock()
+
+  def _register(self, metric: _Metric) -> _Metric:
+    with self._lock:
+      existing = self._metrics.get(metric.name)
+      if existing is not None:
+        return existing
+      self._metrics[metric.name] = metric
+      return metric
+
+  def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return self._register(Counter(name, help_text, labelnames))  # type: ignore[return-value]
+
+  def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+    return self._register(Gauge(name, help_text, labelnames))  # type: ignore[return-value]
+
+  def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return self._register(Histogram(name, help_text, labelnames, buckets))  # type: ignore[return-value]
+
+  def render(self) -> str:
+    with self._lock:
+      metrics = list(self._metrics.values())
+    lines: List[str] = []
+    for m in metrics:
+      lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_LATENCY = REGISTRY.histogram(
+  "acadify_http_request_duration_seconds", "Flask route latency", ("route", "method", "status")
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+  "acadify_upstream_request_duration_seconds", "Latency of calls to Gmail, OpenAI and Telegram", ("service", "op")
+)
+STAGE_LATENCY = REGISTRY.histogram(
+  "acadify_pipeline_stage_duration_seconds", "Latency of local processing stages", ("stage",),
+  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+CACHE_HITS = REGISTRY.counter("acadify_cache_hits_total", "Cache hits", ("cache",))
+CACHE_MISSES = REGISTRY.counter("acadify_cache_misses_total", "Cache misses", ("cache",))
+ERRORS = REGISTRY.counter("acadify_errors_total", "Errors by origin", ("where",))
+POLLER_LAG = REGISTRY.gauge("acadify_poller_lag_seconds", "Seconds since the last completed poller sweep")
+QUEUE_DEPTH = REGISTRY.gauge("acadify_queue_depth", "Items waiting in background queues", ("queue",))
+NOTIFICATIONS = REGISTRY.counter(
+  "acadify_notifications_total", "Alerts by channel and outcome (sent, failed, filtered, dropped)", ("channel", "outcome")
+)
+PREFETCH = REGISTRY.counter(
+  "acadify_prefetch_jobs_total", "Background summary jobs by kind and outcome (done, failed, dropped, over_budget)", ("kind", "outcome")
+)
+ADMISSION = REGISTRY.counter(
+  "acadify_admission_rejected_total", "Heavy jobs refused by admission control by kind and reason (busy, principal, size)", ("kind", "reason")
+)
@@ -0,0 +1,363 @@
+from __future__ import annotations
+import ipaddress
+import json
+import logging
+import queue
+import re
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, tzinfo
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from zoneinfo import ZoneInfo
+
+import requests
+
+from metrics import ERRORS, NOTIFICATIONS, QUEUE_DEPTH
+from store import Store
+
+
+# Notification fan-out. Producers (the poller) only submit() alerts onto a
+# bounded queue; one dispatcher thread applies each user's rules, collects
+# non-urgent alerts into per-user digests for `digest_window` seconds (or
+# until quiet hours end) and hands deliveries to a small sender pool. Every
+# channel has its own token bucket, so a large fan-out drains at the
+# channel's rate instead of all at once.
+
+logger = logging.getLogger(__name__)
+
+URGENCY = {"low": 0, "normal": 1, "high": 2}
+_PHONE = re.compile(r"^\+?[0-9]{7,15}$")
+
+
+def check_webhook_url(url: str) -> str:
+  """`url` if it is https to a public host, else ValueError. Every address
+  the host resolves to is checked, so names pointing at loopback, link-local
+  (cloud metadata) or private ranges are refused too."""
+  parts = urlsplit(url)
+  if parts.scheme != "https" or not parts.hostname:
+    raise ValueError("webhook must be an https:// URL")
+  try:
+    infos = socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)
+  except (socket.gaierror, UnicodeError):
+    raise ValueError(f"webhook host {parts.hostname} does not resolve")
+  for info in infos:
+    if not ipaddress.ip_address(info[4][0].split("%", 1)[0]).is_global:
+      raise ValueError("webhook host must be a public address")
+  return url
+
+
+@dataclass(slots=True)
+class Alert:
+  user: str
+  summary: str  # one line, used in digests
+  text: str  # full message when delivered on its own
+  urgency: str = "normal"
+  ts: float = field(default_factory=time.time)
+
+
+@dataclass
+class Rules:
+  channels: Dict[str, str] = field(default_factory=dict)  # channel -> address; empty = linked defaults
+  min_urgency: str = "normal"
+  immediate_urgency: str = "high"
+  quiet_hours: Optional[Tuple[int, int]] = None  # local [start, end) hours, may wrap midnight
+  digest_window: int = 120
+  timezone: Optional[str] = None
+
+  @classmethod
+  def from_dict(cls, data: Dict[str, Any]) -> "Rules":
+    if not isinstance(data, dict):
+      raise ValueError("rules must be a JSON object")
+    if not isinstance(data.get("channels") or {}, dict):
+      raise ValueError("channels must be an object of channel -> address")
+    rules = cls(
+      channels={str(k): str(v) for k, v in (data.get("channels") or {}).items()},
+      min_urgency=data.get("min_urgency", "normal"),
+      immediate_urgency=data.get("immediate_urgency", "high"),
+      quiet_hours=tuple(data["quiet_hours"]) if data.get("quiet_hours") else None,
+      digest_window=int(data.get("digest_window", 120)),
+      timezone=data.get("timezone"),
+    )
+    if rules.min_urgency not in URGENCY or rules.immediate_urgency not in URGENCY:
+      raise ValueError(f"urgency must be one of {', '.join(URGENCY)}")
+    if rules.quiet_hours is not None and (len(rules.quiet_hours) != 2 or not all(0 <= h < 24 for h in rules.quiet_hours)):
+      raise ValueError("quiet_hours must be [start, end] hours 0-23")
+    if not 0 <= rules.digest_window <= 86400:
+      raise ValueError("digest_window must be 0-86400 seconds")
+    if rules.timezone:
+      ZoneInfo(rules.timezone)  # raises on unknown names
+    if "webhook" in rules.channels:
+      check_webhook_url(rules.channels["webhook"])
+    if "sms" in rules.channels and not _PHONE.match(rules.channels["sms"]):
+      raise ValueError("sms address must be a phone number")
+    return rules
+
+  def to_dict(self) -> Dict[str, Any]:
+    return asdict(self)
+
+  def is_quiet(self, now: float, default_tz: tzinfo) -> bool:
+    if not self.quiet_hours:
+      return False
+    start, end = self.quiet_hours
+    hour = datetime.fromtimestamp(now, ZoneInfo(self.timezone) if self.timezone else default_tz).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+# =====================
+# Channels
+# =====================
+
+class Channel:
+  name = ""
+  rate = 10.0  # sends per second
+
+  def send(self, address: str, text: str) -> None:
+    raise NotImplementedError
+
+
+class TelegramChannel(Channel):
+  name = "telegram"
+  rate = 25.0  # Bot API allows ~30 msg/s across chats
+
+  def __init__(self, send: Callable[[int, str], Any]):
+    self._send = send
+
+  def send(self, address: str, text: str) -> None:
+    self._send(int(address), text)
+
+
+class SmsChannel(Channel):
+  """Local stand-in for an SMS gateway: messages land in `outbox`."""
+  name = "sms"
+  rate = 1.0
+
+  def __init__(self, maxlen: int = 500):
+    self.outbox: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+
+  def send(self, address: str, text: str) -> None:
+    self.outbox.append({"to": address, "text": text[:1600], "ts": int(time.time())})
+    logger.info("[sms stub] to %s: %s", address, text.splitlines()[0] if text else "")
+
+
+class WebhookChannel(Channel):
+  name = "webhook"
+  rate = 5.0
+
+  def send(self, address: str, text: str) -> None:
+    # re-checked per send: the name may resolve elsewhere since the rules
+    # were saved; redirects could lead anywhere, so they are not followed
+    resp = requests.post(check_webhook_url(address), json={"text": text}, timeout=10, allow_redirects=False)
+    resp.raise_for_status()
+
+
+class InAppChannel(Channel):
+  name = "inapp"
+  rate = 1000.0
+
+  def __init__(self, maxlen: int = 100):
+    self._maxlen = maxlen
+    self._lock = threading.Lock()
+    self._inboxes: Dict[str, Deque[Dict[str, Any]]] = {}
+
+  def send(self, address: str, text: str) -> None:
+    with self._lock:
+      inbox = self._inboxes.setdefault(address, deque(maxlen=self._maxlen))
+      inbox.append({"text": text, "ts": int(time.time())})
+
+  def inbox(self, address: str) -> List[Dict[str, Any]]:
+    with self._lock:
+      return list(self._inboxes.get(address, ()))
+
+
+class _TokenBucket:
+  def __init__(self, rate: float, burst: Optional[float] = None):
+    self.rate = rate
+    self.capacity = burst or max(1.0, rate)
+    self._tokens = self.capacity
+    self._last = time.monotonic()
+    self._lock = threading.Lock()
+
+  def acquire(self) -> None:
+    while True:
+      with self._lock:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens >= 1:
+          self._tokens -= 1
+          return
+        wait = (1 - self._tokens) / self.rate
+      time.sleep(wait)
+
+
+# =====================
+# Engine
+# =====================
+
+def format_digest(alerts: List[Alert]) -> str:
+  if len(alerts) == 1:
+    return alerts[0].text
+  lines = [f"📬 {len(alerts)} academic updates"]
+  lines += [f"• {a.summary}" for a in alerts]
+  return "\n".join(lines)
+
+
+class Notifier:
+  def __init__(self, store: Store, channels: List[Channel], default_tz: tzinfo,
+               max_pending: int = 10000, senders: int = 4, tick: float = 1.0):
+    self.store = store
+    self.default_tz = default_tz
+    self.channels: Dict[str, Channel] = {c.name: c for c in channels}
+    self._buckets = {c.name: _TokenBucket(c.rate) for c in channels}
+    self._queue: "queue.Queue[Alert]" = queue.Queue(maxsize=max_pending)
+    self._send_queue: "queue.Queue[Tuple[str, str, str]]" = queue.Queue(maxsize=senders * 50)
+    self._senders = senders
+    self._tick = tick
+    self._lock = threading.Lock()
+    self._rules: Dict[str, Rules] = {}
+    self._links: Dict[str, Dict[str, str]] = {}
+    self._digests: Dict[str, List[Alert]] = {}
+    self._due: Dict[str, float] = {}
+    self._threads: List[threading.Thread] = []
+
+  # -- users --
+
+  def link(self, user: str, channel: str, address: str) -> None:
+    with self._lock:
+      self._links.setdefault(user, {})[channel] = address
+
+  def rules(self, user: str) -> Rules:
+    with self._lock:
+      cached = self._rules.get(user)
+    if cached is not None:
+      return cached
+    raw = self.store.get_state(user, "notify:rules")
+    try:
+      rules = Rules.from_dict(json.loads(raw)) if raw else Rules()
+    except ValueError as e:
+      # saved before validation tightened (or the webhook host moved)
+      logger.warning("Ignoring stored notification rules for %s: %s", user, e)
+      rules = Rules()
+    with self._lock:
+      self._rules[user] = rules
+    return rules
+
+  def set_rules(self, user: str, rules: Rules) -> None:
+    # Telegram and in-app deliver only to what the user has linked
+    with self._lock:
+      links = dict(self._links.get(user, {}))
+    for channel, address in rules.channels.items():
+      if channel not in self.channels:
+        raise ValueError(f"unknown channel {channel}")
+      if channel in ("telegram", "inapp") and address != links.get(channel):
+        raise ValueError(f"{channel} address must be your linked {channel} account")
+    self.store.set_state(user, "notify:rules", json.dumps(rules.to_dict()))
+    with self._lock:
+      self._rules[user] = rules
+
+  def _targets(self, user: str, rules: Rules) -> Dict[str, str]:
+    if rules.channels:
+      return {c: a for c, a in rules.channels.items() if c in self.channels}
+    with self._lock:
+      return dict(self._links.get(user, {}))
+
+  # -- producers --
+
+  def submit(self, alert: Alert) -> bool:
+    self.start()
+    try:
+      self._queue.put_nowait(alert)
+    except queue.Full:
+      NOTIFICATIONS.inc(channel="-", outcome="dropped")
+      return False
+    QUEUE_DEPTH.inc(queue="notify")
+    return True
+
+  def flush(self, user: Optional[str] = None) -> None:
+    # Deliver held digests now, ignoring windows and quiet hours
+    with self._lock:
+      users = [user] if user else list(self._digests)
+      batches = [(u, self._digests.pop(u, [])) for u in users]
+      for u in users:
+        self._due.pop(u, None)
+    for u, alerts in batches:
+      if alerts:
+        self._deliver(u, alerts)
+
+  def pending(self) -> int:
+    return self._queue.qsize() + self._send_queue.qsize()
+
+  # -- workers --
+
+  def start(self) -> None:
+    with self._lock:
+      if self._threads:
+        return
+      self._threads.append(threading.Thread(target=self._dispatch_loop, name="notify-dispatch", daemon=True))
+      for n in range(self._senders):
+        self._threads.append(threading.Thread(target=self._send_loop, name=f"notify-send-{n}", daemon=True))
+      for t in self._threads:
+        t.start()
+
+  def _dispatch_loop(self):
+    while True:
+      try:
+        alert = self._queue.get(timeout=self._tick)
+      except queue.Empty:
+        alert = None
+      try:
+        if alert is not None:
+          QUEUE_DEPTH.dec(queue="notify")
+          self._route(alert)
+        self._release_due()
+      except Exception as e:
+        ERRORS.inc(where="notify")
+        logger.error("Notification dispatch failed: %s", e)
+
+  def _route(self, alert: Alert):
+    rules = self.rules(alert.user)
+    level = URGENCY.get(alert.urgency, 1)
+    if level < URGENCY[rules.min_urgency]:
+      NOTIFICATIONS.inc(channel="-", outcome="filtered")
+      return
+    now = time.time()
+    if level >= URGENCY[rules.immediate_urgency] and not rules.is_quiet(now, self.default_tz):
+      self._deliver(alert.user, [alert])
+      return
+    with self._lock:
+      self._digests.setdefault(alert.user, []).append(alert)
+      self._due.setdefault(alert.user, alert.ts + rules.digest_window)
+
+  def _release_due(self):
+    now = time.time()
+    with self._lock:
+      due = [u for u, t in self._due.items() if t <= now]
+    for user in due:
+      if self.rules(user).is_quiet(now, self.default_tz):
+        continue
+      with self._lock:
+        alerts = self._digests.pop(user, [])
+        self._due.pop(user, None)
+      if alerts:
+        self._deliver(user, alerts)
+
+  def _deliver(self, user: str, alerts: List[Alert]):
+    text = format_digest(alerts)
+    for channel, address in self._targets(user, self.rules(user)).items():
+      # blocks the dispatcher (never the producer) when senders fall behind
+      self._send_queue.put((channel, address, text))
+
+  def _send_loop(self):
+    while True:
+      channel, address, text = self._send_queue.get()
+      self._buckets[channel].acquire()
+      try:
+        self.channels[channel].send(address, text)
+        NOTIFICATIONS.inc(channel=channel, outcome="sent")
+      except Exception as e:
+        NOTIFICATIONS.inc(channel=channel, outcome="failed")
+        logger.error("Notification via %s to %s failed: %s", channel, address, e)
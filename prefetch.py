@@ -0,0 +1,129 @@
+from __future__ import annotations
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import PREFETCH, QUEUE_DEPTH
+
+
+# Background warm-up of LLM summaries. Jobs are ordered by (priority,
+# -recency); every job carries an estimated token cost that is reserved
+# against a rolling daily budget before it runs, so a burst of class-wide
+# mail cannot run up the OpenAI bill. When the job finishes the reservation
+# is replaced by what it actually spent (reported through charge()), so a
+# job answered from the shared artifact store costs nothing. Jobs over
+# budget wait in the queue until the window rolls over; the queue is
+# bounded and sheds its least important jobs first.
+
+logger = logging.getLogger(__name__)
+
+BUDGET_WINDOW = 86400.0
+
+_job_spend: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("prefetch_job_spend", default=None)
+
+
+def charge(tokens: int) -> None:
+  """Tokens actually spent by the running prefetch job; no-op elsewhere."""
+  spend = _job_spend.get()
+  if spend is not None:
+    spend[0] += tokens
+
+
+class Prefetcher:
+  def __init__(self, daily_tokens: int, workers: int = 2, max_pending: int = 1000):
+    self.daily_tokens = daily_tokens
+    self.max_pending = max_pending
+    self._workers = workers
+    self._heap: List[Tuple[int, int, int, str, str, int, Callable[[], Any]]] = []
+    self._keys: set = set()
+    self._seq = itertools.count()
+    self._cond = threading.Condition()
+    self._spent = 0
+    self._window_start = time.time()
+    self._threads: List[threading.Thread] = []
+
+  def submit(self, key: str, kind: str, priority: int, recency: int, cost: int, job: Callable[[], Any]) -> bool:
+    """Queue `job` unless `key` is already pending. Lower priority runs
+    first; ties go to the larger `recency` (newest message)."""
+    if cost > self.daily_tokens:
+      # could never be reserved and would block the head of the queue
+      PREFETCH.inc(kind=kind, outcome="over_budget")
+      return False
+    with self._cond:
+      if key in self._keys:
+        return False
+      heapq.heappush(self._heap, (priority, -recency, next(self._seq), key, kind, cost, job))
+      self._keys.add(key)
+      QUEUE_DEPTH.inc(queue="prefetch")
+      if len(self._heap) > self.max_pending:
+        worst = max(self._heap)
+        self._heap.remove(worst)
+        heapq.heapify(self._heap)
+        self._keys.discard(worst[3])
+        QUEUE_DEPTH.dec(queue="prefetch")
+        PREFETCH.inc(kind=worst[4], outcome="dropped")
+      self._cond.notify()
+    self._start()
+    return True
+
+  def status(self) -> Dict[str, Any]:
+    with self._cond:
+      self._roll()
+      return {
+        "pending": len(self._heap),
+        "spentTokens": self._spent,
+        "dailyTokens": self.daily_tokens,
+        "windowResetsIn": int(self._window_start + BUDGET_WINDOW - time.time()),
+      }
+
+  def _roll(self):
+    if time.time() - self._window_start >= BUDGET_WINDOW:
+      self._window_start = time.time()
+      self._spent = 0
+
+  def _start(self):
+    with self._cond:
+      if self._threads:
+        return
+      for n in range(self._workers):
+        t = threading.Thread(target=self._run, name=f"prefetch-{n}", daemon=True)
+        self._threads.append(t)
+        t.start()
+
+  def _take(self) -> Optional[Tuple[str, str, int, Callable[[], Any]]]:
+    with self._cond:
+      while True:
+        self._roll()
+        if self._heap and self._spent + self._heap[0][5] <= self.daily_tokens:
+          _, _, _, key, kind, cost, job = heapq.heappop(self._heap)
+          self._keys.discard(key)
+          self._spent += cost
+          QUEUE_DEPTH.dec(queue="prefetch")
+          return key, kind, cost, job
+        # empty, or the head is over budget: wait for work or the next window
+        timeout = None if not self._heap else max(1.0, self._window_start + BUDGET_WINDOW - time.time())
+        self._cond.wait(timeout)
+
+  def _run(self):
+    while True:
+      key, kind, cost, job = self._take()
+      spend = [0]
+      token = _job_spend.set(spend)
+      try:
+        job()
+        PREFETCH.inc(kind=kind, outcome="done")
+      except Exception as e:
+        PREFETCH.inc(kind=kind, outcome="failed")
+        logger.error("Prefetch %s failed: %s", key, e)
+      finally:
+        _job_spend.reset(token)
+        self._settle(cost, spend[0])
+
+  def _settle(self, reserved: int, spent: int):
+    with self._cond:
+      self._spent = max(0, self._spent - reserved + spent)
+      self._cond.notify_all()
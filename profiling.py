@@ -0,0 +1,231 @@
+from __future__ import annotations
+import cProfile
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+# On-demand profiling for one request or one poller sweep, plus a
+# tracemalloc monitor. Output is written to PROFILE_DIR:
+#   <id>.folded  collapsed stacks, feed to flamegraph.pl / speedscope
+#   <id>.prof    cProfile stats (cprofile mode only), open with snakeviz
+#   <id>.txt     pstats text, top functions by cumulative time
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "acadify-profiles")
+MODES = ("sample", "cprofile")
+
+_index_lock = threading.Lock()
+PROFILES: Deque[Dict[str, Any]] = deque(maxlen=100)
+
+
+def _frame_label(frame) -> str:
+  code = frame.f_code
+  return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+  def __init__(self, thread_id: int, interval: float = 0.002):
+    self.thread_id = thread_id
+    self.interval = interval
+    self.stacks: Counter = Counter()
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+
+  def _run(self):
+    while not self._stop.wait(self.interval):
+      frame = sys._current_frames().get(self.thread_id)
+      stack: List[str] = []
+      while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+      if stack:
+        self.stacks[";".join(reversed(stack))] += 1
+
+  def start(self):
+    self._thread.start()
+
+  def stop(self) -> str:
+    self._stop.set()
+    self._thread.join()
+    return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()) + "\n"
+
+
+def _folded_from_pstats(stats: pstats.Stats) -> str:
+  # cProfile has no stacks; emit caller;callee edges weighted by time (µs)
+  lines = []
+  for func, (_, _, tt, _, callers) in stats.stats.items():  # type: ignore[attr-defined]
+    name = f"{func[2]} ({os.path.basename(func[0])}:{func[1]})"
+    if not callers:
+      lines.append(f"{name} {int(tt * 1e6)}")
+    for caller, (_, _, ctt, _) in callers.items():
+      parent = f"{caller[2]} ({os.path.basename(caller[0])}:{caller[1]})"
+      lines.append(f"{parent};{name} {int(ctt * 1e6)}")
+  return "\n".join(line for line in lines if not line.endswith(" 0")) + "\n"
+
+
+class ProfileSession:
+  def __init__(self, mode: str, label: str):
+    self.mode = mode if mode in MODES else "sample"
+    self.label = label
+    self.started = time.time()
+    self._t0 = time.perf_counter()
+    self._profiler: Optional[cProfile.Profile] = None
+    self._sampler: Optional[_Sampler] = None
+    if self.mode == "cprofile":
+      self._profiler = cProfile.Profile()
+      self._profiler.enable()
+    else:
+      self._sampler = _Sampler(threading.get_ident())
+      self._sampler.start()
+
+  def stop(self) -> Dict[str, Any]:
+    elapsed = time.perf_counter() - self._t0
+    pid = f"{int(self.started)}-{os.urandom(3).hex()}"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, pid)
+    files = []
+    if self._profiler is not None:
+      self._profiler.disable()
+      self._profiler.dump_stats(base + ".prof")
+      buf = io.StringIO()
+      stats = pstats.Stats(self._profiler, stream=buf)
+      stats.sort_stats("cumulative").print_stats(40)
+      with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(buf.getvalue())
+      folded = _folded_from_pstats(stats)
+      files += ["prof", "txt"]
+    else:
+      folded = self._sampler.stop() if self._sampler else ""
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+      f.write(folded)
+    files.append("folded")
+    meta = {"id": pid, "mode": self.mode, "label": self.label, "started": int(self.started),
+            "ms": round(elapsed * 1000, 1), "formats": files}
+    with _index_lock:
+      dropped = PROFILES[0] if len(PROFILES) == PROFILES.maxlen else None
+      PROFILES.append(meta)
+    if dropped is not None:
+      # the files live only as long as their index entry
+      for fmt in dropped["formats"]:
+        try:
+          os.remove(os.path.join(PROFILE_DIR, f"{dropped['id']}.{fmt}"))
+        except OSError:
+          pass
+    return meta
+
+
+def profile_call(mode: str, label: str, fn: Callable[[], Any]) -> Dict[str, Any]:
+  session = ProfileSession(mode, label)
+  try:
+    fn()
+  finally:
+    meta = session.stop()
+  return meta
+
+
+def read_profile(pid: str, fmt: str) -> Optional[bytes]:
+  if fmt not in ("folded", "prof", "txt") or not all(c.isalnum() or c == "-" for c in pid):
+    return None
+  path = os.path.join(PROFILE_DIR, f"{pid}.{fmt}")
+  if not os.path.exists(path):
+    return None
+  with open(path, "rb") as f:
+    return f.read()
+
+
+# Poller: arm once, the next sweep is profiled
+_poller_mode: Optional[str] = None
+
+
+def arm_poller(mode: str) -> None:
+  global _poller_mode
+  _poller_mode = mode if mode in MODES else "sample"
+
+
+def take_poller_arm() -> Optional[str]:
+  global _poller_mode
+  mode, _poller_mode = _poller_mode, None
+  return mode
+
+
+# =====================
+# tracemalloc
+# =====================
+
+_tm_lock = threading.Lock()
+_tm_snapshots: Deque[tracemalloc.Snapshot] = deque(maxlen=10)
+_tm_stop = threading.Event()
+_tm_thread: Optional[threading.Thread] = None
+_TM_FILTERS = [
+  tracemalloc.Filter(False, tracemalloc.__file__),
+  tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+  tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _tm_take() -> tracemalloc.Snapshot:
+  snap = tracemalloc.take_snapshot().filter_traces(_TM_FILTERS)
+  with _tm_lock:
+    _tm_snapshots.append(snap)
+  return snap
+
+
+def _tm_loop(interval: float):
+  while not _tm_stop.wait(interval):
+    if not tracemalloc.is_tracing():
+      return
+    _tm_take()
+
+
+def start_tracemalloc(nframes: int = 5, interval: float = 60.0) -> None:
+  global _tm_thread
+  if nframes < 1 or not interval > 0:
+    raise ValueError("nframes must be >= 1 and interval > 0")
+  if not tracemalloc.is_tracing():
+    tracemalloc.start(nframes)
+  if _tm_thread is None or not _tm_thread.is_alive():
+    _tm_stop.clear()
+    _tm_thread = threading.Thread(target=_tm_loop, args=(interval,), daemon=True)
+    _tm_thread.start()
+
+
+def stop_tracemalloc() -> None:
+  _tm_stop.set()
+  tracemalloc.stop()
+  with _tm_lock:
+    _tm_snapshots.clear()
+
+
+def tracemalloc_report(limit: int = 20, key_type: str = "lineno") -> Dict[str, Any]:
+  if not tracemalloc.is_tracing():
+    return {"tracing": False}
+  key_type = key_type if key_type in ("lineno", "filename", "traceback") else "lineno"
+  with _tm_lock:
+    first = _tm_snapshots[0] if _tm_snapshots else None
+  latest = _tm_take()
+  current, peak = tracemalloc.get_traced_memory()
+
+  def render(stat) -> Dict[str, Any]:
+    frames = stat.traceback.format() if key_type == "traceback" else [str(stat.traceback[0])]
+    out = {"where": frames, "kib": round(stat.size / 1024, 1), "count": stat.count}
+    if hasattr(stat, "size_diff"):
+      out["kib_diff"] = round(stat.size_diff / 1024, 1)
+    return out
+
+  report = {
+    "tracing": True,
+    "current_kib": round(current / 1024, 1),
+    "peak_kib": round(peak / 1024, 1),
+    "snapshots": len(_tm_snapshots),
+    "top": [render(s) for s in latest.statistics(key_type)[:limit]],
+  }
+  if first is not None and first is not latest:
+    report["growth"] = [render(s) for s in latest.compare_to(first, key_type)[:limit]]
+  return report
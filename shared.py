@@ -0,0 +1,174 @@
+from __future__ import annotations
+import hashlib
+import re
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import guards
+from metrics import ADMISSION, CACHE_HITS, CACHE_MISSES
+from store import Store
+
+
+# Shared content layer. Class-wide mail reaches hundreds of inboxes; bodies
+# and attachments are fingerprinted so parsing, PDF extraction and
+# summaries are computed once per distinct content and reused by every
+# account that received it.
+#
+# Artifacts are keyed on the exact content only: sha256 of the normalized
+# text (greeting, addresses, tracking parameters, case and spacing removed)
+# or of the attachment bytes. Artifacts that can echo what normalization
+# drops (summaries) are keyed on the raw bytes of their input instead. Near duplicates are detected too, with a
+# MinHash signature over word 3-shingles indexed as BANDS bands of ROWS
+# values (LSH), a candidate being accepted when the signatures agree on
+# NEAR_JACCARD of their positions and all numbers match. They are recorded
+# as aliases for links and stats, never for artifacts: "lecture postponed"
+# and "lecture cancelled" are near duplicates with different summaries.
+
+NEAR_JACCARD = 0.8
+BANDS, ROWS = 16, 4
+MAX_SHINGLES = 2000  # signature input cap
+MIN_WORDS = 8  # shorter texts are matched exactly only
+# One 64-bit shingle hash, permuted by XOR with fixed masks
+_MASKS = [int.from_bytes(hashlib.blake2b(str(i).encode(), digest_size=8).digest(), "big") for i in range(BANDS * ROWS)]
+
+_GREETING = re.compile(r"^\s*(dear|hi|hello|hey)\b[^\n,]{0,60}[,\n]", re.IGNORECASE)
+_EMAILS = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_URL_QUERY = re.compile(r"(https?://[^\s?#]+)[?#]\S*")
+_WORD = re.compile(r"\w+")
+_NUMBER = re.compile(r"\d+")
+
+
+class Fingerprint(NamedTuple):
+  hash: str
+  # 8-byte digest of the numbers, then the MinHash values; None for binary
+  # content and very short text
+  signature: Optional[bytes]
+  size: int
+
+
+def normalize_text(text: str) -> str:
+  # Per-recipient noise out: salutation, addresses, tracking query strings,
+  # case, spacing
+  text = _EMAILS.sub(" ", _GREETING.sub(" ", text).lower())
+  text = _URL_QUERY.sub(r"\1", text)
+  return " ".join(text.split())
+
+
+def minhash(words: List[str]) -> bytes:
+  shingles = {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+  hashes = [
+    int.from_bytes(hashlib.blake2b(sh.encode(), digest_size=8).digest(), "big")
+    for sh in list(shingles)[:MAX_SHINGLES]
+  ]
+  return b"".join(min(h ^ m for h in hashes).to_bytes(8, "big") for m in _MASKS)
+
+
+def _bands(signature: bytes) -> List[int]:
+  # SQLite INTEGER is signed 64-bit: keep band keys to 63 bits
+  numbers, width = signature[:8], ROWS * 8
+  return [
+    int.from_bytes(hashlib.blake2b(numbers + signature[8 + i * width:8 + (i + 1) * width], digest_size=8).digest(), "big") >> 1
+    for i in range(BANDS)
+  ]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+  if a[:8] != b[:8]:
+    return 0.0
+  n = (len(a) - 8) // 8
+  return sum(a[8 + i * 8:16 + i * 8] == b[8 + i * 8:16 + i * 8] for i in range(n)) / n
+
+
+def fingerprint_text(text: str) -> Fingerprint:
+  norm = normalize_text(text)
+  words = _WORD.findall(norm)
+  sig = None
+  if len(words) >= MIN_WORDS:
+    numbers = hashlib.blake2b(" ".join(_NUMBER.findall(norm)).encode(), digest_size=8).digest()
+    sig = numbers + minhash(words)
+  return Fingerprint(hashlib.sha256(norm.encode()).hexdigest(), sig, len(norm))
+
+
+def fingerprint_bytes(blob: bytes) -> Fingerprint:
+  return Fingerprint(hashlib.sha256(blob).hexdigest(), None, len(blob))
+
+
+class SharedContent:
+  def __init__(self, store: Store, wait: Optional[float] = None, ttl: Optional[int] = None, prune_every: int = 3600):
+    self.store = store
+    # content older than `ttl` seconds is dropped with its artifacts, checked
+    # at most every `prune_every` seconds when new content is registered
+    self.ttl = ttl
+    self.prune_every = prune_every
+    self._pruned_at = 0.0
+    # how long an interactive caller (one with a guards principal) waits for
+    # another caller's computation of the same artifact before computing it
+    # itself; background waits on
+    self.wait = wait
+    self._lock = threading.Lock()
+    self._inflight: Dict[str, threading.Lock] = {}
+
+  def resolve(self, fp: Fingerprint, kind: str) -> str:
+    """Content hash for `fp` (its exact hash), registering it when it is
+    new and recording a near-duplicate alias when one matches."""
+    if self.store.has_content(fp.hash):
+      CACHE_HITS.inc(cache=f"shared_{kind}")
+      return fp.hash
+    CACHE_MISSES.inc(cache=f"shared_{kind}")
+    bands = _bands(fp.signature) if fp.signature is not None else []
+    if bands:
+      for other, signature in self.store.near_candidates(kind, bands):
+        if similarity(fp.signature, signature) >= NEAR_JACCARD:
+          self.store.put_alias(fp.hash, self.store.cluster(other))
+          CACHE_HITS.inc(cache=f"shared_{kind}_near")
+          break
+    self.store.put_content(fp.hash, kind, fp.signature, fp.size, bands, int(time.time()))
+    self._maybe_prune()
+    return fp.hash
+
+  def _maybe_prune(self) -> None:
+    now = time.time()
+    if not self.ttl or now - self._pruned_at < self.prune_every:
+      return
+    self._pruned_at = now
+    self.store.prune_content(int(now) - self.ttl)
+
+  def artifact(self, content: str, name: str, compute: Callable[[], str]) -> str:
+    """Stored artifact `name` of `content`; computed once even when
+    several recipients ask for it concurrently. An interactive caller still
+    waiting after `wait` seconds computes it too."""
+    value = self.store.get_artifact(content, name)
+    if value is not None:
+      CACHE_HITS.inc(cache="artifact")
+      return value
+    key = f"{content}:{name}"
+    with self._lock:
+      lock = self._inflight.setdefault(key, threading.Lock())
+    timeout = self.wait if self.wait is not None and guards.principal() is not None else -1
+    held = lock.acquire(timeout=timeout)
+    if not held:
+      ADMISSION.inc(kind="artifact", reason="wait")
+    try:
+      value = self.store.get_artifact(content, name)
+      if value is None:
+        CACHE_MISSES.inc(cache="artifact")
+        value = compute()
+        self.store.put_artifact(content, name, value, int(time.time()))
+      else:
+        CACHE_HITS.inc(cache="artifact")
+    finally:
+      if held:
+        lock.release()
+        with self._lock:
+          self._inflight.pop(key, None)
+    return value
+
+  def cached(self, fp: Fingerprint, name: str) -> bool:
+    # no registration, no near-duplicate search
+    return self.store.get_artifact(fp.hash, name) is not None
+
+  def link(self, account: str, source: str, source_id: str, content: str) -> None:
+    # under the first content of its near-duplicate group, so stats count
+    # one announcement however its copies differ
+    self.store.link_content(account, source, source_id, self.store.cluster(content))
@@ -0,0 +1,445 @@
+from __future__ import annotations
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Local item store shared by the Gmail and Classroom ingesters. SQLite in WAL
+# mode with one connection per thread, so request threads read while the
+# poller writes.
+#
+# agg_counts and agg_version are maintained by triggers on items, so the
+# dashboard aggregates are updated in the same transaction as the ingest
+# that changed them and reading them never scans items.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+  account     TEXT NOT NULL,
+  source      TEXT NOT NULL,
+  source_id   TEXT NOT NULL,
+  course_id   TEXT,
+  kind        TEXT,
+  title       TEXT NOT NULL,
+  type        TEXT NOT NULL,
+  due_ts      INTEGER,
+  sort_ts     INTEGER NOT NULL,
+  link        TEXT,
+  unread      INTEGER,
+  important   INTEGER,
+  PRIMARY KEY (account, source, source_id)
+);
+CREATE INDEX IF NOT EXISTS items_feed ON items (account, sort_ts DESC, source, source_id);
+CREATE INDEX IF NOT EXISTS items_due ON items (account, due_ts) WHERE due_ts IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS courses (
+  account     TEXT NOT NULL,
+  course_id   TEXT NOT NULL,
+  name        TEXT,
+  section     TEXT,
+  update_time TEXT,
+  PRIMARY KEY (account, course_id)
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+  account TEXT NOT NULL,
+  key     TEXT NOT NULL,
+  value   TEXT,
+  PRIMARY KEY (account, key)
+);
+
+CREATE TABLE IF NOT EXISTS calendar_events (
+  account   TEXT NOT NULL,
+  event_id  TEXT NOT NULL,
+  body_hash TEXT NOT NULL,
+  synced_at INTEGER NOT NULL,
+  PRIMARY KEY (account, event_id)
+);
+
+-- shared content (see shared.py): one row per distinct body / attachment,
+-- derived artifacts stored once and accounts linked to them
+CREATE TABLE IF NOT EXISTS content (
+  hash      TEXT PRIMARY KEY,
+  kind      TEXT NOT NULL,
+  signature BLOB,
+  size      INTEGER NOT NULL,
+  created   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS content_bands (
+  kind  TEXT NOT NULL,
+  band  INTEGER NOT NULL,
+  value INTEGER NOT NULL,
+  hash  TEXT NOT NULL,
+  PRIMARY KEY (kind, band, value, hash)
+);
+CREATE TABLE IF NOT EXISTS content_alias (
+  hash      TEXT PRIMARY KEY,
+  canonical TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+  hash    TEXT NOT NULL,
+  name    TEXT NOT NULL,
+  value   TEXT NOT NULL,
+  created INTEGER NOT NULL,
+  PRIMARY KEY (hash, name)
+);
+CREATE TABLE IF NOT EXISTS content_links (
+  account   TEXT NOT NULL,
+  source    TEXT NOT NULL,
+  source_id TEXT NOT NULL,
+  hash      TEXT NOT NULL,
+  PRIMARY KEY (account, source, source_id, hash)
+);
+CREATE INDEX IF NOT EXISTS content_links_hash ON content_links (hash);
+CREATE INDEX IF NOT EXISTS content_created ON content (created);
+CREATE INDEX IF NOT EXISTS content_bands_hash ON content_bands (hash);
+"""
+
+# Run after SCHEMA, once the items columns of older databases are migrated
+VIEWS = """
+CREATE INDEX IF NOT EXISTS items_unread ON items (account, sort_ts DESC) WHERE unread = 1 AND important = 1;
+
+-- counts by type, per account (course_id '') and per course
+CREATE TABLE IF NOT EXISTS agg_counts (
+  account   TEXT NOT NULL,
+  course_id TEXT NOT NULL,
+  type      TEXT NOT NULL,
+  n         INTEGER NOT NULL,
+  PRIMARY KEY (account, course_id, type)
+);
+-- bumped on every visible change to an account's items
+CREATE TABLE IF NOT EXISTS agg_version (
+  account TEXT PRIMARY KEY,
+  version INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS items_agg_insert AFTER INSERT ON items BEGIN
+  INSERT INTO agg_counts VALUES (new.account, '', new.type, 1)
+    ON CONFLICT (account, course_id, type) DO UPDATE SET n = n + 1;
+  INSERT INTO agg_counts SELECT new.account, new.course_id, new.type, 1 WHERE new.course_id IS NOT NULL
+    ON CONFLICT (account, course_id, type) DO UPDATE SET n = n + 1;
+  INSERT INTO agg_version VALUES (new.account, 1)
+    ON CONFLICT (account) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_agg_delete AFTER DELETE ON items BEGIN
+  UPDATE agg_counts SET n = n - 1
+    WHERE account = old.account AND type = old.type AND course_id IN ('', COALESCE(old.course_id, ''));
+  INSERT INTO agg_version VALUES (old.account, 1)
+    ON CONFLICT (account) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_agg_retype AFTER UPDATE OF type, course_id ON items
+WHEN old.type IS NOT new.type OR old.course_id IS NOT new.course_id BEGIN
+  UPDATE agg_counts SET n = n - 1
+    WHERE account = old.account AND type = old.type AND course_id IN ('', COALESCE(old.course_id, ''));
+  INSERT INTO agg_counts VALUES (new.account, '', new.type, 1)
+    ON CONFLICT (account, course_id, type) DO UPDATE SET n = n + 1;
+  INSERT INTO agg_counts SELECT new.account, new.course_id, new.type, 1 WHERE new.course_id IS NOT NULL
+    ON CONFLICT (account, course_id, type) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_agg_touch AFTER UPDATE ON items
+WHEN old.title IS NOT new.title OR old.type IS NOT new.type OR old.due_ts IS NOT new.due_ts
+  OR old.course_id IS NOT new.course_id OR old.link IS NOT new.link
+  OR old.unread IS NOT new.unread OR old.important IS NOT new.important BEGIN
+  INSERT INTO agg_version VALUES (new.account, 1)
+    ON CONFLICT (account) DO UPDATE SET version = version + 1;
+END;
+"""
+
+ITEM_COLUMNS = ("account", "source", "source_id", "course_id", "kind", "title", "type", "due_ts", "sort_ts", "link", "unread", "important")
+
+
+def account_key(tokens: Optional[Dict[str, Any]]) -> str:
+  # Stable per Google account: the address recorded at login survives token
+  # refreshes and re-consent, and is shared by the browser session and the
+  # Telegram link. Tokens without one (linked before it was recorded) fall
+  # back to the refresh token.
+  if not tokens:
+    return "service"
+  email = (tokens.get("email") or "").strip().lower()
+  if email:
+    return hashlib.sha256(f"email:{email}".encode()).hexdigest()[:16]
+  secret = tokens.get("refresh_token") or tokens.get("access_token") or ""
+  return hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+
+class Store:
+  def __init__(self, path: str):
+    self.path = path
+    self._local = threading.local()
+    self._init_lock = threading.Lock()
+    self._initialized = False
+
+  def _conn(self) -> sqlite3.Connection:
+    conn = getattr(self._local, "conn", None)
+    if conn is None:
+      conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+      conn.row_factory = sqlite3.Row
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")
+      with self._init_lock:
+        if not self._initialized:
+          conn.executescript(SCHEMA)
+          self._migrate(conn)
+          conn.executescript(VIEWS)
+          self._initialized = True
+      self._local.conn = conn
+    return conn
+
+  def ping(self) -> None:
+    """Raises when the database cannot be queried."""
+    self._conn().execute("SELECT 1").fetchone()
+
+  @staticmethod
+  def _migrate(conn: sqlite3.Connection) -> None:
+    have = {r[1] for r in conn.execute("PRAGMA table_info(items)")}
+    added = [c for c in ("unread", "important") if c not in have]
+    for column in added:
+      conn.execute(f"ALTER TABLE items ADD COLUMN {column} INTEGER")
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name='agg_counts'").fetchone():
+      # first start with the aggregate tables: seed them from existing items
+      conn.executescript(VIEWS)
+      with conn:
+        conn.execute(
+          "INSERT INTO agg_counts SELECT account, '', type, COUNT(*) FROM items GROUP BY account, type"
+        )
+        conn.execute(
+          "INSERT INTO agg_counts SELECT account, course_id, type, COUNT(*) FROM items "
+          "WHERE course_id IS NOT NULL GROUP BY account, course_id, type"
+        )
+        conn.execute("INSERT INTO agg_version SELECT account, 1 FROM items GROUP BY account")
+
+  # -- items --
+
+  def upsert_items(self, rows: Iterable[Dict[str, Any]]) -> int:
+    values = [tuple(r.get(c) for c in ITEM_COLUMNS) for r in rows]
+    if not values:
+      return 0
+    conn = self._conn()
+    with conn:
+      conn.executemany(
+        f"INSERT INTO items ({', '.join(ITEM_COLUMNS)}) VALUES ({', '.join('?' * len(ITEM_COLUMNS))}) "
+        "ON CONFLICT (account, source, source_id) DO UPDATE SET "
+        "course_id=excluded.course_id, kind=excluded.kind, title=excluded.title, type=excluded.type, "
+        "due_ts=excluded.due_ts, sort_ts=excluded.sort_ts, link=excluded.link, "
+        "unread=excluded.unread, important=excluded.important",
+        values,
+      )
+    return len(values)
+
+  def known_ids(self, account: str, source: str, ids: List[str]) -> set:
+    if not ids:
+      return set()
+    marks = ",".join("?" * len(ids))
+    rows = self._conn().execute(
+      f"SELECT source_id FROM items WHERE account=? AND source=? AND source_id IN ({marks})",
+      (account, source, *ids),
+    ).fetchall()
+    return {r[0] for r in rows}
+
+  def feed(self, account: str, after: Optional[Tuple[int, str, str]] = None, limit: int = 50) -> List[sqlite3.Row]:
+    # Newest first, keyset-paginated on (sort_ts, source, source_id)
+    if after is None:
+      return self._conn().execute(
+        "SELECT * FROM items WHERE account=? ORDER BY sort_ts DESC, source DESC, source_id DESC LIMIT ?",
+        (account, limit),
+      ).fetchall()
+    return self._conn().execute(
+      "SELECT * FROM items WHERE account=? AND (sort_ts, source, source_id) < (?, ?, ?) "
+      "ORDER BY sort_ts DESC, source DESC, source_id DESC LIMIT ?",
+      (account, *after, limit),
+    ).fetchall()
+
+  def deadlines(self, account: str, since_ts: int) -> List[sqlite3.Row]:
+    return self._conn().execute(
+      "SELECT * FROM items WHERE account=? AND due_ts IS NOT NULL AND due_ts >= ? ORDER BY due_ts",
+      (account, since_ts),
+    ).fetchall()
+
+  def oldest_sort_ts(self, account: str, source: str) -> Optional[int]:
+    return self._conn().execute(
+      "SELECT MIN(sort_ts) FROM items WHERE account=? AND source=?", (account, source),
+    ).fetchone()[0]
+
+  def set_unread(self, account: str, source: str, unread_ids: List[str]) -> None:
+    # unread_ids is the complete unread set as reported by the source for the
+    # indexed window (items not in it are marked read); it can
+    # run to thousands, so it goes through a temp table, not bound parameters
+    conn = self._conn()
+    with conn:
+      conn.execute("CREATE TEMP TABLE IF NOT EXISTS unread_ids (source_id TEXT PRIMARY KEY)")
+      conn.execute("DELETE FROM unread_ids")
+      conn.executemany("INSERT OR IGNORE INTO unread_ids VALUES (?)", ((i,) for i in unread_ids))
+      conn.execute(
+        "UPDATE items SET unread = 0 WHERE account=? AND source=? AND unread = 1"
+        " AND source_id NOT IN (SELECT source_id FROM unread_ids)",
+        (account, source),
+      )
+      conn.execute(
+        "UPDATE items SET unread = 1 WHERE account=? AND source=? AND unread IS NOT 1"
+        " AND source_id IN (SELECT source_id FROM unread_ids)",
+        (account, source),
+      )
+
+  # -- dashboard aggregates --
+
+  def agg_version(self, account: str) -> int:
+    row = self._conn().execute("SELECT version FROM agg_version WHERE account=?", (account,)).fetchone()
+    return row[0] if row else 0
+
+  def agg_counts(self, account: str) -> List[sqlite3.Row]:
+    return self._conn().execute(
+      "SELECT course_id, type, n FROM agg_counts WHERE account=? AND n > 0", (account,)
+    ).fetchall()
+
+  def next_due(self, account: str, since_ts: int) -> Optional[int]:
+    row = self._conn().execute(
+      "SELECT MIN(due_ts) FROM items WHERE account=? AND due_ts >= ?", (account, since_ts)
+    ).fetchone()
+    return row[0] if row else None
+
+  def upcoming_deadlines(self, account: str, since_ts: int, limit: int) -> List[sqlite3.Row]:
+    return self._conn().execute(
+      "SELECT * FROM items WHERE account=? AND due_ts >= ? ORDER BY due_ts LIMIT ?", (account, since_ts, limit)
+    ).fetchall()
+
+  def unread_important(self, account: str, limit: int) -> Tuple[int, List[sqlite3.Row]]:
+    conn = self._conn()
+    count = conn.execute(
+      "SELECT COUNT(*) FROM items WHERE account=? AND unread = 1 AND important = 1", (account,)
+    ).fetchone()[0]
+    rows = conn.execute(
+      "SELECT * FROM items WHERE account=? AND unread = 1 AND important = 1 ORDER BY sort_ts DESC LIMIT ?",
+      (account, limit),
+    ).fetchall()
+    return count, rows
+
+  # -- calendar mirror --
+
+  def calendar_hashes(self, account: str) -> Dict[str, str]:
+    rows = self._conn().execute("SELECT event_id, body_hash FROM calendar_events WHERE account=?", (account,)).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+  def put_calendar_events(self, account: str, synced: Iterable[Tuple[str, str]], synced_at: int) -> None:
+    conn = self._conn()
+    with conn:
+      conn.executemany(
+        "INSERT INTO calendar_events (account, event_id, body_hash, synced_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (account, event_id) DO UPDATE SET body_hash=excluded.body_hash, synced_at=excluded.synced_at",
+        [(account, eid, h, synced_at) for eid, h in synced],
+      )
+
+  # -- courses / sync state --
+
+  def upsert_courses(self, account: str, courses: Iterable[Dict[str, Any]]) -> None:
+    conn = self._conn()
+    with conn:
+      conn.executemany(
+        "INSERT INTO courses (account, course_id, name, section, update_time) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (account, course_id) DO UPDATE SET name=excluded.name, section=excluded.section, update_time=excluded.update_time",
+        [(account, c.get("id"), c.get("name"), c.get("section"), c.get("updateTime")) for c in courses],
+      )
+
+  def courses(self, account: str) -> List[sqlite3.Row]:
+    return self._conn().execute("SELECT * FROM courses WHERE account=? ORDER BY name", (account,)).fetchall()
+
+  def get_state(self, account: str, key: str) -> Optional[str]:
+    row = self._conn().execute("SELECT value FROM sync_state WHERE account=? AND key=?", (account, key)).fetchone()
+    return row[0] if row else None
+
+  def set_state(self, account: str, key: str, value: str) -> None:
+    conn = self._conn()
+    with conn:
+      conn.execute(
+        "INSERT INTO sync_state (account, key, value) VALUES (?, ?, ?) "
+        "ON CONFLICT (account, key) DO UPDATE SET value=excluded.value",
+        (account, key, value),
+      )
+
+  # -- shared content --
+
+  def has_content(self, hash_: str) -> bool:
+    return self._conn().execute("SELECT 1 FROM content WHERE hash=?", (hash_,)).fetchone() is not None
+
+  def cluster(self, hash_: str) -> str:
+    # near-duplicate group of `hash_`: the content it was matched to, if any
+    row = self._conn().execute("SELECT canonical FROM content_alias WHERE hash=?", (hash_,)).fetchone()
+    return row[0] if row else hash_
+
+  def near_candidates(self, kind: str, bands: List[int]) -> List[Tuple[str, bytes]]:
+    clauses = " OR ".join("(b.band=? AND b.value=?)" for _ in bands)
+    params: List[Any] = [kind]
+    for i, v in enumerate(bands):
+      params += [i, v]
+    return [tuple(r) for r in self._conn().execute(
+      f"SELECT DISTINCT c.hash, c.signature FROM content_bands b JOIN content c ON c.hash = b.hash "
+      f"WHERE b.kind=? AND ({clauses})",
+      params,
+    ).fetchall()]
+
+  def put_content(self, hash_: str, kind: str, signature: Optional[bytes], size: int, bands: List[int], created: int) -> None:
+    conn = self._conn()
+    with conn:
+      conn.execute(
+        "INSERT OR IGNORE INTO content (hash, kind, signature, size, created) VALUES (?, ?, ?, ?, ?)",
+        (hash_, kind, signature, size, created),
+      )
+      conn.executemany(
+        "INSERT OR IGNORE INTO content_bands (kind, band, value, hash) VALUES (?, ?, ?, ?)",
+        [(kind, i, v, hash_) for i, v in enumerate(bands)],
+      )
+
+  def put_alias(self, hash_: str, canonical: str) -> None:
+    conn = self._conn()
+    with conn:
+      conn.execute("INSERT OR IGNORE INTO content_alias (hash, canonical) VALUES (?, ?)", (hash_, canonical))
+
+  def get_artifact(self, hash_: str, name: str) -> Optional[str]:
+    row = self._conn().execute("SELECT value FROM artifacts WHERE hash=? AND name=?", (hash_, name)).fetchone()
+    return row[0] if row else None
+
+  def put_artifact(self, hash_: str, name: str, value: str, created: int) -> None:
+    conn = self._conn()
+    with conn:
+      conn.execute(
+        "INSERT INTO artifacts (hash, name, value, created) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (hash, name) DO UPDATE SET value=excluded.value, created=excluded.created",
+        (hash_, name, value, created),
+      )
+
+  def link_content(self, account: str, source: str, source_id: str, hash_: str) -> None:
+    conn = self._conn()
+    with conn:
+      conn.execute(
+        "INSERT OR IGNORE INTO content_links (account, source, source_id, hash) VALUES (?, ?, ?, ?)",
+        (account, source, source_id, hash_),
+      )
+
+  def prune_content(self, before: int) -> int:
+    # content registered before `before`, with its bands, aliases, links and
+    # artifacts; returns the number of contents removed
+    conn = self._conn()
+    with conn:
+      conn.execute("CREATE TEMP TABLE IF NOT EXISTS pruned_content (hash TEXT PRIMARY KEY)")
+      conn.execute("DELETE FROM pruned_content")
+      n = conn.execute("INSERT INTO pruned_content SELECT hash FROM content WHERE created < ?", (before,)).rowcount
+      if n:
+        for table in ("artifacts", "content_bands", "content_links", "content"):
+          conn.execute(f"DELETE FROM {table} WHERE hash IN (SELECT hash FROM pruned_content)")
+        conn.execute(
+          "DELETE FROM content_alias WHERE hash IN (SELECT hash FROM pruned_content)"
+          " OR canonical IN (SELECT hash FROM pruned_content)"
+        )
+    return n
+
+  def content_stats(self) -> Dict[str, int]:
+    conn = self._conn()
+    return {
+      "contents": conn.execute("SELECT COUNT(*) FROM content").fetchone()[0],
+      "aliases": conn.execute("SELECT COUNT(*) FROM content_alias").fetchone()[0],
+      "artifacts": conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0],
+      "links": conn.execute("SELECT COUNT(*) FROM content_links").fetchone()[0],
+      "accounts": conn.execute("SELECT COUNT(DISTINCT account) FROM content_links").fetchone()[0],
+    }
@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+  sys.path.insert(0, ROOT)
+
+# app.py opens its local index at import time; keep it out of the checkout
+os.environ.setdefault("ACADIFY_DB", os.path.join(tempfile.mkdtemp(prefix="acadify-test-"), "test.db"))
+
+
+class _Settings:
+  # every setting unset: app.py falls back to the environment and defaults
+  def __getattr__(self, name):
+    return None
+
+
+# config.py is deployment-specific and not in the repo; app.py only needs
+# `settings` from it
+if importlib.util.find_spec("config") is None:
+  stub = types.ModuleType("config")
+  stub.settings = _Settings()
+  sys.modules["config"] = stub
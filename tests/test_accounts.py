@@ -0,0 +1,41 @@
+import app
+from store import account_key
+
+
+class _Resp:
+  def __init__(self, status_code, body):
+    self.status_code, self._body, self.text = status_code, body, str(body)
+
+  def json(self):
+    return self._body
+
+
+def test_account_key_follows_the_google_account():
+  first = {"access_token": "a1", "refresh_token": "r1", "email": "Student@uni.edu"}
+  relogin = {"access_token": "a2", "refresh_token": "r2", "email": "student@uni.edu"}
+  assert account_key(first) == account_key(relogin)
+  assert account_key(first) != account_key({**first, "email": "other@uni.edu"})
+  # tokens linked before the address was recorded keep their old key
+  assert account_key({"refresh_token": "r1"}) != account_key(first)
+
+
+def test_callback_records_the_account_address(monkeypatch):
+  monkeypatch.setattr(app.app, "secret_key", "test")
+  n = iter(range(100))
+  monkeypatch.setattr(app.requests, "post", lambda *a, **k: _Resp(200, {
+    "access_token": f"a{next(n)}", "refresh_token": f"r{next(n)}", "expires_in": 3600, "scope": "gmail",
+  }))
+  monkeypatch.setattr(app.requests, "get", lambda *a, **k: _Resp(200, {"emailAddress": "student@uni.edu"}))
+  keys = []
+  for _ in range(2):
+    client = app.app.test_client()
+    assert client.get("/auth/google/callback?code=c").status_code == 200
+    with client.session_transaction() as sess:
+      keys.append(account_key(sess["gmail_oauth_tokens"]))
+  assert keys[0] == keys[1]
+
+
+def test_callback_fails_without_profile(monkeypatch):
+  monkeypatch.setattr(app.requests, "post", lambda *a, **k: _Resp(200, {"access_token": "a", "expires_in": 3600}))
+  monkeypatch.setattr(app.requests, "get", lambda *a, **k: _Resp(401, {}))
+  assert app.app.test_client().get("/auth/google/callback?code=c").status_code == 400
@@ -0,0 +1,24 @@
+import threading
+import time
+
+import calendar_sync
+from bench.fakes import FakeCalendar
+from store import Store
+
+
+def test_concurrent_syncs_of_one_account_insert_each_event_once(tmp_path):
+  store = Store(str(tmp_path / "cal.db"))
+  due = int(time.time() * 1000) + 86400000
+  store.upsert_items([
+    {"account": "a", "source": "gmail", "source_id": f"m{i}", "kind": "email", "title": f"Quiz {i}", "type": "quiz",
+     "due_ts": due, "sort_ts": i, "unread": 0, "important": 0}
+    for i in range(10)
+  ])
+  svc = FakeCalendar(latency=0.05)
+  threads = [threading.Thread(target=calendar_sync.sync_account, args=(svc, store, "a")) for _ in range(2)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  assert svc.calls.get("events.insert") == 10
+  assert "events.update" not in svc.calls
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+def ms(*args) -> int:
+  return int(datetime(*args, tzinfo=app.APP_TZ).timestamp() * 1000)
+
+
+REF = ms(2026, 10, 10, 9, 0)
+
+
+@pytest.mark.parametrize("text, expected", [
+  ("exam on 2026-10-20", ms(2026, 10, 20, 23, 59)),
+  ("midterm rescheduled to monday 13/10/2026, 10:00 am", ms(2026, 10, 13, 10, 0)),
+  ("assignment due 17 oct 11:59 pm", ms(2026, 10, 17, 23, 59)),
+  ("assignment due oct 17th", ms(2026, 10, 17, 23, 59)),
+  ("quiz due 12/10", ms(2026, 10, 12, 23, 59)),
+  ("quiz on friday, 16/10 at 14:30", ms(2026, 10, 16, 14, 30)),
+  ("submit 2/3 problems by oct 20", ms(2026, 10, 20, 23, 59)),
+  ("deadline 12/10 but first read 1/2 of chapter 3", ms(2026, 10, 12, 23, 59)),
+  ("exam on 5 jan", ms(2027, 1, 5, 23, 59)),
+  ("exam on 5 january", ms(2027, 1, 5, 23, 59)),
+  ("quiz due sept. 3rd", ms(2027, 9, 3, 23, 59)),
+  ("assignment due may 4", ms(2027, 5, 4, 23, 59)),
+  ("exam 4 may 2027", ms(2027, 5, 4, 23, 59)),
+])
+def test_extract_due_ts(text, expected):
+  assert app.extract_due_ts(text, REF) == expected
+
+
+@pytest.mark.parametrize("text", [
+  "covers 1/2 of syllabus",
+  "pi is 3.14, see v1.2 of the notes",
+  "score 7/10 on the practice set",
+  "no dates here",
+  "quiz marks 10 out of 20",
+  "exam: junior 3",
+  "homework: decide 5 problems",
+  "assignment 2 may be submitted late",
+])
+def test_extract_due_ts_ignores_non_dates(text):
+  assert app.extract_due_ts(text, REF) is None
+
+
+def test_month_name_wins_over_bare_numeric():
+  assert app.extract_due_ts("due 3/4 of the way through, exam on 20 nov", REF) == ms(2026, 11, 20, 23, 59)
+
+
+def test_feb_29_rollover_does_not_raise():
+  items = app.parse_items("Quiz on 29 Feb", "", ref_ms=ms(2028, 5, 1))
+  assert items[0].type == "quiz" and items[0].due_ts is None
+  assert app.extract_due_ts("quiz on 29 feb", ms(2028, 2, 1)) == ms(2028, 2, 29, 23, 59)
+
+
+def test_invalid_dates_are_skipped():
+  assert app.extract_due_ts("exam on 31/02/2026, resit on 15/11/2026", REF) == ms(2026, 11, 15, 23, 59)
+
+
+def test_due_only_for_deadline_types():
+  assert app.parse_items("Library renewal", "books due 12/10", ref_ms=REF)[0].due_ts is None
+  item = app.parse_items("Assignment 3", "due 12/10", ref_ms=REF)[0]
+  assert item.type == "assignment" and item.due_ts == ms(2026, 10, 12, 23, 59)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+import guards
+import shared
+from store import Store
+
+
+@pytest.fixture
+def as_user():
+  token = guards.set_principal("user-a")
+  yield
+  guards.reset_principal(token)
+
+
+def test_per_principal_limit(as_user):
+  gate = guards.Gate("llm", slots=4, per_principal=1, wait=0.05)
+  with gate.admit():
+    with pytest.raises(guards.RateLimited):
+      with gate.admit():
+        pass
+  with gate.admit():
+    pass
+
+
+def test_busy_gate_sheds_interactive_work(as_user):
+  gate = guards.Gate("llm", slots=1, per_principal=2, wait=0.05)
+  held, release = threading.Event(), threading.Event()
+
+  def background():
+    with gate.admit():
+      held.set()
+      release.wait(2)
+  t = threading.Thread(target=background)
+  t.start()
+  held.wait(2)
+  try:
+    with pytest.raises(guards.Overloaded) as e:
+      with gate.admit():
+        pass
+    assert e.value.status == 503 and e.value.retry_after
+  finally:
+    release.set()
+    t.join()
+
+
+def test_memory_budget_and_size_check(as_user):
+  gate = guards.Gate("attachment", slots=4, per_principal=4, memory_bytes=100, wait=0.05)
+  with gate.admit(80):
+    with pytest.raises(guards.Overloaded):
+      with gate.admit(40):
+        pass
+  with pytest.raises(guards.TooLarge):
+    guards.check_size("attachment", 2048, 1024, "Attachment")
+
+
+def _background(content, compute):
+  # no principal in a fresh thread: background
+  t = threading.Thread(target=lambda: content.artifact("h", "summary:3", compute))
+  t.start()
+  return t
+
+
+def test_interactive_caller_waits_for_inflight_computation(tmp_path, as_user):
+  content = shared.SharedContent(Store(str(tmp_path / "g.db")), wait=5)
+  started = threading.Event()
+
+  def slow():
+    started.set()
+    time.sleep(0.2)
+    return "summary"
+  t = _background(content, slow)
+  started.wait(2)
+  try:
+    assert content.artifact("h", "summary:3", lambda: pytest.fail("recomputed")) == "summary"
+  finally:
+    t.join()
+
+
+def test_interactive_caller_computes_after_wait(tmp_path, as_user):
+  content = shared.SharedContent(Store(str(tmp_path / "g.db")), wait=0.05)
+  started, release = threading.Event(), threading.Event()
+
+  def stuck():
+    started.set()
+    release.wait(2)
+    return "summary"
+  t = _background(content, stuck)
+  started.wait(2)
+  try:
+    assert content.artifact("h", "summary:3", lambda: "mine") == "mine"
+  finally:
+    release.set()
+    t.join()
+  assert content._inflight == {}
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import app
+from bench.fakes import FakeGmail
+from store import Store
+
+
+def _item(i, sort_ts, **extra):
+  return {"account": "service", "source": "gmail", "source_id": f"m{i:04d}", "kind": "email", "title": f"t{i}",
+          "type": "other", "sort_ts": sort_ts, "unread": 0, "important": 0, **extra}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+  store = Store(str(tmp_path / "l.db"))
+  monkeypatch.setattr(app, "STORE", store)
+  monkeypatch.setattr(app, "refresh_gmail_index", lambda *a, **k: None)
+  return store
+
+
+@pytest.fixture
+def client():
+  return app.app.test_client()
+
+
+def test_cursor_round_trip_and_malformed():
+  assert app.decode_cursor(app.encode_cursor("s", "5:gmail:m:1")) == ("s", "5:gmail:m:1")
+  for bad in ("!!!", app.encode_cursor("s", "")[:2], "bm9jb2xvbg"):  # "nocolon"
+    with pytest.raises(ValueError):
+      app.decode_cursor(bad)
+
+
+@pytest.mark.parametrize("query", [
+  "cursor=!!!", "cursor=" + app.encode_cursor("g", "token"), "cursor=" + app.encode_cursor("s", "x:gmail:m1"),
+  "limit=0", "limit=abc",
+])
+def test_upcoming_rejects_bad_cursor_or_limit(store, client, query):
+  assert client.get(f"/emails/upcoming?{query}").status_code == 400
+
+
+def test_upcoming_pages_over_equal_sort_ts(store, client):
+  store.upsert_items([_item(i, 5 if i < 7 else i) for i in range(12)])
+  seen, cursor = [], None
+  while True:
+    body = client.get("/emails/upcoming?limit=3" + (f"&cursor={cursor}" if cursor else "")).get_json()
+    seen += [it["emailId"] for it in body["upcoming"]]
+    cursor = body["nextCursor"]
+    if not cursor:
+      break
+  assert sorted(seen) == [f"m{i:04d}" for i in range(12)]
+  assert len(seen) == len(set(seen))
+
+
+def test_upcoming_ndjson_streams_every_item(store, client):
+  store.upsert_items([_item(i, i // 3) for i in range(1200)])
+  resp = client.get("/emails/upcoming?format=ndjson")
+  assert resp.mimetype == "application/x-ndjson"
+  lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+  assert len({it["emailId"] for it in lines}) == 1200
+
+
+def test_sync_hands_off_gmail_cursor(client, monkeypatch):
+  gmail = FakeGmail(7)
+  monkeypatch.setattr(app, "get_gmail_service", lambda: gmail)
+  first = client.get("/emails/sync?limit=4").get_json()
+  assert first["fetched"] == 4 and first["nextCursor"]
+  second = client.get(f"/emails/sync?limit=4&cursor={first['nextCursor']}").get_json()
+  assert second["fetched"] == 3 and second["nextCursor"] is None
+  # index cursors are not accepted here
+  assert client.get("/emails/sync?cursor=" + app.encode_cursor("s", "5:gmail:m1")).status_code == 400
+
+
+def test_agg_counts_follow_item_changes(store):
+  def counts():
+    return {(r["course_id"], r["type"]): r["n"] for r in store.agg_counts("service")}
+  store.upsert_items([_item(0, 1, type="quiz", course_id="c1"), _item(1, 2, type="quiz")])
+  v = store.agg_version("service")
+  assert counts() == {("", "quiz"): 2, ("c1", "quiz"): 1}
+  store.upsert_items([_item(0, 1, type="exam", course_id="c1")])
+  assert counts() == {("", "quiz"): 1, ("", "exam"): 1, ("c1", "exam"): 1}
+  assert store.agg_version("service") > v
+  v = store.agg_version("service")
+  store.upsert_items([_item(0, 1, type="exam", course_id="c1")])  # no visible change
+  assert store.agg_version("service") == v
+
+
+def test_snapshot_etag_revalidates(store, client):
+  store.upsert_items([_item(0, 1, type="quiz")])
+  first = client.get("/dashboard/snapshot")
+  assert first.status_code == 200 and first.get_json()["counts"] == {"quiz": 1}
+  etag = first.headers["ETag"]
+  assert client.get("/dashboard/snapshot", headers={"If-None-Match": etag}).status_code == 304
+  store.upsert_items([_item(1, 2, type="exam")])
+  changed = client.get("/dashboard/snapshot", headers={"If-None-Match": etag})
+  assert changed.status_code == 200 and changed.headers["ETag"] != etag
+  assert changed.get_json()["counts"] == {"quiz": 1, "exam": 1}
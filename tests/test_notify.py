@@ -0,0 +1,48 @@
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import notify
+from store import Store
+
+
+@pytest.fixture
+def notifier(tmp_path):
+  n = notify.Notifier(Store(str(tmp_path / "n.db")), [notify.TelegramChannel(lambda chat_id, text: None), notify.WebhookChannel()], ZoneInfo("UTC"))
+  n.link("acct", "telegram", "42")
+  return n
+
+
+@pytest.mark.parametrize("channels", [
+  ["webhook"],
+  "https://example.com",
+])
+def test_channels_must_be_an_object(channels):
+  with pytest.raises(ValueError):
+    notify.Rules.from_dict({"channels": channels})
+
+
+@pytest.mark.parametrize("url", [
+  "http://example.com/hook",
+  "https://169.254.169.254/latest/meta-data",
+  "https://127.0.0.1/hook",
+  "https://localhost/hook",
+  "https://10.0.0.5/hook",
+  "https://[::1]/hook",
+  "file:///etc/passwd",
+])
+def test_webhook_must_be_public_https(url):
+  with pytest.raises(ValueError):
+    notify.Rules.from_dict({"channels": {"webhook": url}})
+
+
+def test_telegram_only_to_linked_chat(notifier):
+  with pytest.raises(ValueError):
+    notifier.set_rules("acct", notify.Rules.from_dict({"channels": {"telegram": "1234"}}))
+  notifier.set_rules("acct", notify.Rules.from_dict({"channels": {"telegram": "42"}}))
+  assert notifier.rules("acct").channels == {"telegram": "42"}
+
+
+def test_unknown_channel_rejected(notifier):
+  with pytest.raises(ValueError):
+    notifier.set_rules("acct", notify.Rules.from_dict({"channels": {"pager": "x"}}))
@@ -0,0 +1,40 @@
+import time
+
+import prefetch
+
+
+def _settled(p, spent, timeout=2.0):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+    status = p.status()
+    if status["pending"] == 0 and status["spentTokens"] == spent:
+      return True
+    time.sleep(0.01)
+  return False
+
+
+def test_cache_hits_are_refunded():
+  p = prefetch.Prefetcher(daily_tokens=1000, workers=1)
+  ran = []
+  for i in range(5):
+    # each reserves 800 of the 1000 budget but makes no LLM call
+    p.submit(f"k{i}", "email", 0, i, 800, lambda i=i: ran.append(i))
+  assert _settled(p, 0)
+  time.sleep(0.05)
+  assert sorted(ran) == [0, 1, 2, 3, 4]
+
+
+def test_actual_spend_is_charged():
+  p = prefetch.Prefetcher(daily_tokens=1000, workers=1)
+  p.submit("k", "email", 0, 0, 800, lambda: prefetch.charge(300))
+  assert _settled(p, 300)
+
+
+def test_job_over_daily_budget_is_refused():
+  p = prefetch.Prefetcher(daily_tokens=1000, workers=1)
+  assert not p.submit("big", "pdf", 0, 0, 5000, lambda: None)
+  assert p.status()["pending"] == 0
+
+
+def test_charge_outside_a_job_is_a_noop():
+  prefetch.charge(100)
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+import profiling
+
+
+def test_tracemalloc_rejects_busy_loop_settings():
+  with pytest.raises(ValueError):
+    profiling.start_tracemalloc(interval=0)
+  with pytest.raises(ValueError):
+    profiling.start_tracemalloc(nframes=0)
+
+
+def test_profile_files_are_deleted_with_their_entry(tmp_path, monkeypatch):
+  monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+  monkeypatch.setattr(profiling, "PROFILES", profiling.deque(maxlen=2))
+  metas = [profiling.profile_call("sample", f"p{i}", lambda: None) for i in range(3)]
+  assert [m["id"] for m in profiling.PROFILES] == [metas[1]["id"], metas[2]["id"]]
+  assert sorted(os.listdir(tmp_path)) == sorted(f"{m['id']}.folded" for m in metas[1:])
@@ -0,0 +1,92 @@
+import pytest
+
+import shared
+from store import Store
+
+BASE = (
+  "The CS201 lecture on Thursday 16/10 at 10:00 in LH-3 is {} because the instructor is travelling "
+  "to a conference. Slides for the week and the reading list are on the course portal, and office "
+  "hours move to Friday as usual. Please check the portal for further updates from the course staff."
+)
+
+
+@pytest.fixture
+def content(tmp_path):
+  return shared.SharedContent(Store(str(tmp_path / "c.db")))
+
+
+def test_exact_normalized_text_shares_artifacts(content):
+  a = content.resolve(shared.fingerprint_text("Dear Alice,\n" + BASE.format("cancelled")), "text")
+  b = content.resolve(shared.fingerprint_text("Hi Bob,\n" + BASE.format("cancelled")), "text")
+  assert a == b
+  content.artifact(a, "summary:3", lambda: "cancelled")
+  assert content.artifact(b, "summary:3", lambda: pytest.fail("recomputed")) == "cancelled"
+
+
+def test_near_duplicates_never_share_artifacts(content):
+  fp_a = shared.fingerprint_text(BASE.format("cancelled"))
+  fp_b = shared.fingerprint_text(BASE.format("postponed"))
+  assert shared.similarity(fp_a.signature, fp_b.signature) >= shared.NEAR_JACCARD
+  a, b = content.resolve(fp_a, "text"), content.resolve(fp_b, "text")
+  assert a != b
+  content.artifact(a, "summary:3", lambda: "Lecture CANCELLED")
+  assert content.artifact(b, "summary:3", lambda: "Lecture postponed") == "Lecture postponed"
+  assert not content.cached(fp_b, "items")
+  # linked as one announcement for stats
+  content.link("acct1", "gmail", "m1", a)
+  content.link("acct2", "gmail", "m2", b)
+  assert content.store.content_stats()["aliases"] == 1
+  assert {r[0] for r in content.store._conn().execute("SELECT hash FROM content_links")} == {a}
+
+
+def test_failed_compute_is_not_left_in_flight(content):
+  h = content.resolve(shared.fingerprint_text(BASE.format("moved")), "text")
+
+  def boom():
+    raise RuntimeError("upstream down")
+  with pytest.raises(RuntimeError):
+    content.artifact(h, "summary:3", boom)
+  assert content._inflight == {}
+  assert content.artifact(h, "summary:3", lambda: "ok") == "ok"
+
+
+def test_personalized_copies_never_share_a_summary(content, monkeypatch):
+  import app
+  monkeypatch.setattr(app, "SHARED", content)
+  calls = []
+
+  def fake_llm(text, max_lines=3):
+    calls.append(text)
+    return "Summary of: " + text[:80]
+  monkeypatch.setattr(app, "_summarize_openai", fake_llm)
+  body = BASE.format("cancelled") + " Join: https://meet.example.edu/cs201?token={}\nSent to {}"
+  alice = app.summarize_text("Dear Alice,\n" + body.format("ALICE-SECRET", "alice@uni.edu"))
+  bob = app.summarize_text("Dear Bob,\n" + body.format("BOB-SECRET", "bob@uni.edu"))
+  assert len(calls) == 2
+  assert "Alice" not in bob and "ALICE" not in calls[1]
+  assert "Bob" not in alice
+  # an identical copy is still summarized once
+  assert app.summarize_text("Dear Bob,\n" + body.format("BOB-SECRET", "bob@uni.edu")) == bob
+  assert len(calls) == 2
+
+
+def test_old_content_is_pruned_with_its_artifacts(tmp_path, monkeypatch):
+  content = shared.SharedContent(Store(str(tmp_path / "p.db")), ttl=3600, prune_every=0)
+  monkeypatch.setattr(shared.time, "time", lambda: 1_000_000)
+  old = content.resolve(shared.fingerprint_text(BASE.format("cancelled")), "text")
+  content.artifact(old, "summary:3", lambda: "old")
+  content.link("acct1", "gmail", "m1", old)
+  monkeypatch.setattr(shared.time, "time", lambda: 1_000_000 + 7200)
+  new = content.resolve(shared.fingerprint_text(BASE.format("postponed")), "text")
+  stats = content.store.content_stats()
+  assert (stats["contents"], stats["artifacts"], stats["links"], stats["aliases"]) == (1, 0, 0, 0)
+  assert content.store.has_content(new) and not content.store.has_content(old)
+
+
+def test_posted_text_is_not_stored(content, monkeypatch):
+  import app
+  monkeypatch.setattr(app, "SHARED", content)
+  monkeypatch.setattr(app, "_summarize_openai", lambda text, max_lines=3: "summary")
+  resp = app.app.test_client().post("/summarize", json={"text": BASE.format("cancelled")})
+  assert resp.get_json()["summary"] == "summary"
+  assert content.store.content_stats()["contents"] == 0
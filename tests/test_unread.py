@@ -0,0 +1,62 @@
+import app
+from store import Store
+
+
+def _rows(n):
+  return [
+    {"account": "a", "source": "gmail", "source_id": f"m{i}", "kind": "email", "title": f"t{i}", "type": "other",
+     "sort_ts": i, "unread": 1, "important": 1}
+    for i in range(n)
+  ]
+
+
+def test_set_unread_handles_large_sets(tmp_path):
+  store = Store(str(tmp_path / "s.db"))
+  store.upsert_items(_rows(3000))
+  store.set_unread("a", "gmail", [f"m{i}" for i in range(0, 3000, 2)])
+  assert store.unread_important("a", 1)[0] == 1500
+  store.set_unread("a", "gmail", [])
+  assert store.unread_important("a", 1)[0] == 0
+
+
+class _Pages:
+  def __init__(self, pages, fail_at=None):
+    self.pages, self.fail_at = pages, fail_at
+
+  def users(self):
+    return self
+
+  def messages(self):
+    return self
+
+  def list(self, pageToken=None, **_):
+    n = int(pageToken or 0)
+    if n == self.fail_at:
+      raise app.HttpError(type("R", (), {"status": 500, "reason": "boom"})(), b"")
+    resp = {"messages": [{"id": i} for i in self.pages[n]]}
+    if n + 1 < len(self.pages):
+      resp["nextPageToken"] = str(n + 1)
+    return type("C", (), {"execute": lambda _self: resp})()
+
+
+def test_list_all_message_ids_pages_and_reports_failure():
+  pages = [[f"a{i}" for i in range(500)], [f"b{i}" for i in range(200)]]
+  assert len(app.list_all_message_ids("is:unread", svc=_Pages(pages))) == 700
+  assert app.list_all_message_ids("is:unread", svc=_Pages(pages, fail_at=1)) is None
+  assert app.list_all_message_ids("is:unread", svc=_Pages(pages), max_pages=1) is None
+
+
+def test_unread_sync_is_limited_to_the_indexed_window(tmp_path, monkeypatch):
+  store = Store(str(tmp_path / "w.db"))
+  store.upsert_items([{**r, "sort_ts": 1_700_000_000_000 + r["sort_ts"] * 1000} for r in _rows(3)])
+  monkeypatch.setattr(app, "STORE", store)
+  monkeypatch.setattr(app, "list_messages", lambda **_: ["m0", "m1", "m2"])
+  queries = []
+
+  def list_all(query, svc=None):
+    queries.append(query)
+    return ["m1"]
+  monkeypatch.setattr(app, "list_all_message_ids", list_all)
+  app.ingest_gmail("a", svc=object())
+  assert queries == ["is:unread after:1699999999"]
+  assert store.unread_important("a", 1)[0] == 1
@@ -0,0 +1,236 @@
+from __future__ import annotations
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+
+# Minimal span tracer. IDs follow W3C trace-context and finished traces are
+# exported as OTLP/JSON, so files and collectors written here can be read by
+# any OpenTelemetry tooling without the SDK being a dependency.
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "acadify-backend"
+
+_current: ContextVar[Optional["Span"]] = ContextVar("acadify_current_span", default=None)
+
+
+class _Trace:
+  __slots__ = ("trace_id", "spans", "lock")
+
+  def __init__(self, trace_id: str):
+    self.trace_id = trace_id
+    self.spans: List[Span] = []
+    self.lock = threading.Lock()
+
+
+class Span:
+  __slots__ = ("name", "trace", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+  def __init__(self, name: str, trace: _Trace, parent_id: Optional[str], attributes: Dict[str, Any]):
+    self.name = name
+    self.trace = trace
+    self.span_id = os.urandom(8).hex()
+    self.parent_id = parent_id
+    self.start_ns = time.time_ns()
+    self.end_ns: Optional[int] = None
+    self.attributes = attributes
+    self.error: Optional[str] = None
+    with trace.lock:
+      trace.spans.append(self)
+
+  @property
+  def trace_id(self) -> str:
+    return self.trace.trace_id
+
+  @property
+  def duration_ms(self) -> float:
+    end = self.end_ns if self.end_ns is not None else time.time_ns()
+    return (end - self.start_ns) / 1e6
+
+  def set(self, key: str, value: Any) -> "Span":
+    self.attributes[key] = value
+    return self
+
+
+class _NoopSpan:
+  def set(self, key: str, value: Any) -> "_NoopSpan":
+    return self
+
+
+_NOOP = _NoopSpan()
+
+
+def current_span():
+  return _current.get() or _NOOP
+
+
+def _parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+  # version-traceid-parentid-flags
+  if not header:
+    return None
+  parts = header.strip().split("-")
+  if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+    return None
+  return parts[1], parts[2]
+
+
+def begin(name: str, traceparent: Optional[str] = None, **attributes: Any) -> Tuple[Span, Token]:
+  parent = _current.get()
+  if parent is not None:
+    s = Span(name, parent.trace, parent.span_id, attributes)
+  else:
+    remote = _parse_traceparent(traceparent)
+    trace = _Trace(remote[0] if remote else os.urandom(16).hex())
+    s = Span(name, trace, remote[1] if remote else None, attributes)
+  return s, _current.set(s)
+
+
+def end(s: Span, token: Token, error: Optional[BaseException] = None) -> None:
+  if error is not None:
+    s.error = repr(error)
+  s.end_ns = time.time_ns()
+  _current.reset(token)
+  if _current.get() is None:
+    _finish(s)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+  s, token = begin(name, **attributes)
+  try:
+    yield s
+  except BaseException as e:
+    end(s, token, e)
+    raise
+  end(s, token)
+
+
+def traced(name: str) -> Callable:
+  def decorator(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+      with span(name):
+        return fn(*args, **kwargs)
+    return wrapper
+  return decorator
+
+
+# =====================
+# Export
+# =====================
+
+_config = {"file": None, "endpoint": None, "slow_ms": 2000.0}
+_file_lock = threading.Lock()
+_export_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=1000)
+_exporter_started = False
+SLOW_TRACES: Deque[Dict[str, Any]] = deque(maxlen=50)
+
+
+def configure(file: Optional[str] = None, endpoint: Optional[str] = None, slow_ms: Optional[float] = None) -> None:
+  _config["file"] = file
+  _config["endpoint"] = endpoint.rstrip("/") if endpoint else None
+  if slow_ms is not None:
+    _config["slow_ms"] = float(slow_ms)
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+  if isinstance(v, bool):
+    return {"boolValue": v}
+  if isinstance(v, int):
+    return {"intValue": str(v)}
+  if isinstance(v, float):
+    return {"doubleValue": v}
+  return {"stringValue": str(v)}
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+  out = []
+  for s in spans:
+    d: Dict[str, Any] = {
+      "traceId": s.trace_id,
+      "spanId": s.span_id,
+      "name": s.name,
+      "kind": 1,
+      "startTimeUnixNano": str(s.start_ns),
+      "endTimeUnixNano": str(s.end_ns or s.start_ns),
+      "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+      "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id:
+      d["parentSpanId"] = s.parent_id
+    out.append(d)
+  return {"resourceSpans": [{
+    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+    "scopeSpans": [{"scope": {"name": "acadify.tracing"}, "spans": out}],
+  }]}
+
+
+def format_tree(spans: List[Span]) -> str:
+  ids = {s.span_id for s in spans}
+  children: Dict[Optional[str], List[Span]] = {}
+  for s in spans:
+    parent = s.parent_id if s.parent_id in ids else None
+    children.setdefault(parent, []).append(s)
+  lines: List[str] = []
+
+  def walk(parent: Optional[str], depth: int):
+    for s in sorted(children.get(parent, []), key=lambda x: x.start_ns):
+      attrs = " ".join(f"{k}={v}" for k, v in s.attributes.items())
+      err = f" ERROR {s.error}" if s.error else ""
+      lines.append(f"{'  ' * depth}{s.name} {s.duration_ms:.1f}ms {attrs}{err}".rstrip())
+      walk(s.span_id, depth + 1)
+
+  walk(None, 0)
+  return "\n".join(lines)
+
+
+def _finish(root: Span) -> None:
+  trace = root.trace
+  with trace.lock:
+    spans = list(trace.spans)
+  if root.duration_ms >= _config["slow_ms"]:
+    tree = format_tree(spans)
+    SLOW_TRACES.append({"traceId": trace.trace_id, "name": root.name, "ms": round(root.duration_ms, 1), "tree": tree})
+    logger.warning("Slow trace %s (%.0fms):\n%s", trace.trace_id, root.duration_ms, tree)
+  if not _config["file"] and not _config["endpoint"]:
+    return
+  try:
+    _export_queue.put_nowait(to_otlp(spans))
+  except queue.Full:
+    return
+  _ensure_exporter()
+
+
+def _ensure_exporter() -> None:
+  global _exporter_started
+  if _exporter_started:
+    return
+  _exporter_started = True
+  threading.Thread(target=_export_loop, daemon=True).start()
+
+
+def _export_loop() -> None:
+  while True:
+    payload = _export_queue.get()
+    if _config["file"]:
+      try:
+        with _file_lock, open(_config["file"], "a", encoding="utf-8") as f:
+          f.write(json.dumps(payload) + "\n")
+      except OSError as e:
+        logger.error("Trace file export failed: %s", e)
+    if _config["endpoint"]:
+      try:
+        requests.post(f"{_config['endpoint']}/v1/traces", json=payload, timeout=5)
+      except Exception as e:
+        logger.error("Trace collector export failed: %s", e)